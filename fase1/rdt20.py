@@ -50,7 +50,7 @@ class RDT20Sender:
     WAIT_CALL_FROM_ABOVE = "Esperar chamada de cima"
     WAIT_ACK_OR_NAK = "Esperar ACK ou NAK"
     
-    def __init__(self, host='localhost', port=5000, dest_host='localhost', dest_port=5001, channel=None):
+    def __init__(self, host='localhost', port=5000, dest_host='localhost', dest_port=5001, channel=None, sock=None):
         """
         Inicializa o remetente.
         
@@ -60,16 +60,20 @@ class RDT20Sender:
             dest_host: endereço de destino
             dest_port: porta de destino
             channel: canal não confiável (usado no simulador)
+            sock: socket UDP já vinculado (opcional; dispensa o bind local)
         """
         self.host = host
-        self.port = port
         self.dest_addr = (dest_host, dest_port)
-        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        self.socket.bind((host, port))
+        if sock is None:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sock.bind((host, port))
+        self.socket = sock
+        self.port = sock.getsockname()[1]
         self.socket.settimeout(5.0)
         self.channel = channel
         self.logger = setup_logger('RDT20Sender')
         self.retransmissions = 0
+        self.on_retransmit = None  # callback(total) chamado a cada retransmissão
         
         # Estado inicial do FSM
         self.state = self.WAIT_CALL_FROM_ABOVE
@@ -217,7 +221,7 @@ class RDT20Sender:
                     self.logger.warning(
                         f"\n[Estado: {self.state}] NAK recebido, retransmitindo dados: {self._format_packet_payload(self.sndpkt)}"
                     )
-                    self.retransmissions += 1
+                    self._count_retransmission()
                     # Ação: udt_send(sndpkt)
                     self.udt_send(self.sndpkt)
                     # Transição: Estado 2 -> Estado 2 (permanece)
@@ -228,7 +232,7 @@ class RDT20Sender:
                     self.logger.warning(
                         f"\n[Estado: {self.state}] ACK/NAK corrompido recebido, retransmitindo dados: {self._format_packet_payload(self.sndpkt)}"
                     )
-                    self.retransmissions += 1
+                    self._count_retransmission()
                     # Ação: udt_send(sndpkt)
                     self.udt_send(self.sndpkt)
                     # Transição: Estado 2 -> Estado 2 (permanece)
@@ -248,7 +252,7 @@ class RDT20Sender:
                 self.logger.warning(
                     f"\n[Estado: {self.state}] Timeout aguardando ACK/NAK, retransmitindo dados: {self._format_packet_payload(self.sndpkt)}"
                 )
-                self.retransmissions += 1
+                self._count_retransmission()
                 # Retransmitir em caso de timeout
                 self.udt_send(self.sndpkt)
                 continue
@@ -262,10 +266,20 @@ class RDT20Sender:
         """Alias para rdt_send para compatibilidade."""
         return self.rdt_send(data)
     
+    def _count_retransmission(self):
+        """Contabiliza uma retransmissão e notifica o callback on_retransmit, se houver."""
+        self.retransmissions += 1
+        if self.on_retransmit is not None:
+            self.on_retransmit(self.retransmissions)
+    
     def get_retransmissions(self):
         """Retorna número de retransmissões."""
         return self.retransmissions
     
+    def reset_stats(self):
+        """Zera os contadores para reaproveitar o remetente em uma nova execução."""
+        self.retransmissions = 0
+    
     def get_state(self):
         """Retorna o estado atual do FSM."""
         return self.state
@@ -283,7 +297,7 @@ class RDT20Receiver:
     # Estado do FSM
     WAIT_CALL_FROM_BELOW = "Esperar chamada de baixo"
     
-    def __init__(self, host='localhost', port=5001, channel=None):
+    def __init__(self, host='localhost', port=5001, channel=None, sock=None):
         """
         Inicializa o receptor.
         
@@ -291,11 +305,14 @@ class RDT20Receiver:
             host: endereço local
             port: porta local
             channel: canal não confiável (usado no simulador)
+            sock: socket UDP já vinculado (opcional; dispensa o bind local)
         """
         self.host = host
-        self.port = port
-        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        self.socket.bind((host, port))
+        if sock is None:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sock.bind((host, port))
+        self.socket = sock
+        self.port = sock.getsockname()[1]
         self.channel = channel
         self.logger = setup_logger('RDT20Receiver')
         self.messages = []
@@ -464,6 +481,12 @@ class RDT20Receiver:
             'corrupted': self.corrupted_count
         }
     
+    def reset_stats(self):
+        """Zera os contadores para reaproveitar o receptor em uma nova execução."""
+        self.messages = []
+        self.received_count = 0
+        self.corrupted_count = 0
+    
     def get_state(self):
         """Retorna o estado atual do FSM."""
         return self.state
@@ -33,7 +33,7 @@ class RDT21Sender:
     WAIT_CALL_1_FROM_ABOVE = "Esperar chamada 1 de cima"
     WAIT_ACK_OR_NAK_1 = "Esperar ACK ou NAK 1"
     
-    def __init__(self, host='localhost', port=5000, dest_host='localhost', dest_port=5001, channel=None):
+    def __init__(self, host='localhost', port=5000, dest_host='localhost', dest_port=5001, channel=None, sock=None):
         """
         Inicializa o remetente.
         
@@ -43,16 +43,20 @@ class RDT21Sender:
             dest_host: endereço de destino
             dest_port: porta de destino
             channel: canal não confiável
+            sock: socket UDP já vinculado (opcional; dispensa o bind local)
         """
         self.host = host
-        self.port = port
         self.dest_addr = (dest_host, dest_port)
-        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        self.socket.bind((host, port))
+        if sock is None:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sock.bind((host, port))
+        self.socket = sock
+        self.port = sock.getsockname()[1]
         self.socket.settimeout(5.0)
         self.channel = channel
         self.logger = setup_logger('RDT21Sender')
         self.retransmissions = 0
+        self.on_retransmit = None  # callback(total) chamado a cada retransmissão
         
         # Estado inicial do FSM
         self.state = self.WAIT_CALL_0_FROM_ABOVE
@@ -144,7 +148,7 @@ class RDT21Sender:
                 # Evento: rdt_rcv(rcvpkt) && (corrupt(rcvpkt) || isNAK(rcvpkt))
                 if self.corrupt(rcvpkt) or self.isNAK(rcvpkt):
                     self.logger.warning(f"[Estado: {self.state}] ACK/NAK corrompido ou NAK recebido, retransmitindo...")
-                    self.retransmissions += 1
+                    self._count_retransmission()
                     # Ação: udt_send(sndpkt)
                     self.udt_send(self.sndpkt)
                     # Transição: permanece no mesmo estado
@@ -169,13 +173,13 @@ class RDT21Sender:
                     else:
                         # ACK com número de sequência incorreto (duplicado)
                         self.logger.warning(f"[Estado: {self.state}] ACK duplicado recebido, retransmitindo...")
-                        self.retransmissions += 1
+                        self._count_retransmission()
                         self.udt_send(self.sndpkt)
                         continue
                         
             except socket.timeout:
                 self.logger.warning(f"[Estado: {self.state}] Timeout aguardando ACK/NAK, retransmitindo...")
-                self.retransmissions += 1
+                self._count_retransmission()
                 self.udt_send(self.sndpkt)
                 continue
             except Exception as e:
@@ -188,10 +192,20 @@ class RDT21Sender:
         """Alias para rdt_send para compatibilidade."""
         return self.rdt_send(data)
     
+    def _count_retransmission(self):
+        """Contabiliza uma retransmissão e notifica o callback on_retransmit, se houver."""
+        self.retransmissions += 1
+        if self.on_retransmit is not None:
+            self.on_retransmit(self.retransmissions)
+    
     def get_retransmissions(self):
         """Retorna número de retransmissões."""
         return self.retransmissions
     
+    def reset_stats(self):
+        """Zera os contadores para reaproveitar o remetente em uma nova execução."""
+        self.retransmissions = 0
+    
     def get_state(self):
         """Retorna o estado atual do FSM."""
         return self.state
@@ -210,7 +224,7 @@ class RDT21Receiver:
     WAIT_0_FROM_BELOW = "Esperar 0 de baixo"
     WAIT_1_FROM_BELOW = "Esperar 1 de baixo"
     
-    def __init__(self, host='localhost', port=5001, channel=None):
+    def __init__(self, host='localhost', port=5001, channel=None, sock=None):
         """
         Inicializa o receptor.
         
@@ -218,11 +232,14 @@ class RDT21Receiver:
             host: endereço local
             port: porta local
             channel: canal não confiável
+            sock: socket UDP já vinculado (opcional; dispensa o bind local)
         """
         self.host = host
-        self.port = port
-        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        self.socket.bind((host, port))
+        if sock is None:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sock.bind((host, port))
+        self.socket = sock
+        self.port = sock.getsockname()[1]
         self.channel = channel
         self.logger = setup_logger('RDT21Receiver')
         self.messages = []
@@ -399,6 +416,13 @@ class RDT21Receiver:
             'duplicates': self.duplicate_count
         }
     
+    def reset_stats(self):
+        """Zera os contadores para reaproveitar o receptor em uma nova execução."""
+        self.messages = []
+        self.received_count = 0
+        self.corrupted_count = 0
+        self.duplicate_count = 0
+    
     def get_state(self):
         """Retorna o estado atual do FSM."""
         return self.state
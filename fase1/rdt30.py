@@ -36,7 +36,7 @@ class RDT30Sender:
     WAIT_CALL_1_FROM_ABOVE = "Esperar chamada 1 de cima"
     WAIT_ACK_1 = "Esperar ACK 1"
     
-    def __init__(self, host='localhost', port=5000, dest_host='localhost', dest_port=5001, channel=None, timeout=2.0):
+    def __init__(self, host='localhost', port=5000, dest_host='localhost', dest_port=5001, channel=None, timeout=2.0, sock=None):
         """
         Inicializa o remetente.
         
@@ -47,16 +47,20 @@ class RDT30Sender:
             dest_port: porta de destino
             channel: canal não confiável
             timeout: timeout inicial em segundos
+            sock: socket UDP já vinculado (opcional; dispensa o bind local)
         """
         self.host = host
-        self.port = port
         self.dest_addr = (dest_host, dest_port)
-        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        self.socket.bind((host, port))
+        if sock is None:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sock.bind((host, port))
+        self.socket = sock
+        self.port = sock.getsockname()[1]
         self.socket.settimeout(0.1)  # Timeout curto para verificar periodicamente
         self.channel = channel
         self.logger = setup_logger('RDT30Sender')
         self.retransmissions = 0
+        self.on_retransmit = None  # callback(total) chamado a cada retransmissão
         self.timeout_interval = timeout
         self.timer = None
         self.timer_lock = threading.Lock()
@@ -94,7 +98,7 @@ class RDT30Sender:
         Ação: udt_send(sndpkt), start_timer()
         """
         self.logger.warning(f"[Estado: {self.state}] Timeout ocorreu (temporização), retransmitindo...")
-        self.retransmissions += 1
+        self._count_retransmission()
         
         # Ação: udt_send(sndpkt)
         if self.sndpkt:
@@ -227,6 +231,12 @@ class RDT30Sender:
         """Alias para rdt_send para compatibilidade."""
         return self.rdt_send(data)
     
+    def _count_retransmission(self):
+        """Contabiliza uma retransmissão e notifica o callback on_retransmit, se houver."""
+        self.retransmissions += 1
+        if self.on_retransmit is not None:
+            self.on_retransmit(self.retransmissions)
+    
     def get_retransmissions(self):
         """Retorna número de retransmissões."""
         return self.retransmissions
@@ -245,6 +255,12 @@ class RDT30Sender:
             'throughput_mbps': throughput / 1_000_000
         }
     
+    def reset_stats(self):
+        """Zera os contadores para reaproveitar o remetente em uma nova execução."""
+        self.retransmissions = 0
+        self.bytes_sent = 0
+        self.start_time = None
+    
     def get_state(self):
         """Retorna o estado atual do FSM."""
         return self.state
@@ -265,7 +281,7 @@ class RDT30Receiver:
     WAIT_0_FROM_BELOW = "Esperar 0 de baixo"
     WAIT_1_FROM_BELOW = "Esperar 1 de baixo"
     
-    def __init__(self, host='localhost', port=5001, channel=None):
+    def __init__(self, host='localhost', port=5001, channel=None, sock=None):
         """
         Inicializa o receptor.
         
@@ -273,11 +289,14 @@ class RDT30Receiver:
             host: endereço local
             port: porta local
             channel: canal não confiável
+            sock: socket UDP já vinculado (opcional; dispensa o bind local)
         """
         self.host = host
-        self.port = port
-        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        self.socket.bind((host, port))
+        if sock is None:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sock.bind((host, port))
+        self.socket = sock
+        self.port = sock.getsockname()[1]
         self.channel = channel
         self.logger = setup_logger('RDT30Receiver')
         self.expected_seq = 0
@@ -437,6 +456,13 @@ class RDT30Receiver:
             'duplicates': self.duplicate_count
         }
     
+    def reset_stats(self):
+        """Zera os contadores para reaproveitar o receptor em uma nova execução."""
+        self.messages = []
+        self.received_count = 0
+        self.corrupted_count = 0
+        self.duplicate_count = 0
+    
     def get_state(self):
         """Retorna o estado atual do FSM."""
         return self.state
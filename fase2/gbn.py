@@ -27,6 +27,7 @@ FSM do Receptor (Figura 3.21):
   2. default (qualquer outro caso): udt_send(sndpkt) - reenviar último ACK
 """
 import socket
+import logging
 import sys
 import os
 import threading
@@ -47,7 +48,7 @@ class GBNSender:
     WAIT = "Esperar"
     
     def __init__(self, host='localhost', port=6000, dest_host='localhost', dest_port=6001, 
-                 channel=None, window_size=5, timeout=2.0):
+                 channel=None, window_size=5, timeout=2.0, sock=None):
         """
         Inicializa o remetente GBN.
         
@@ -59,12 +60,15 @@ class GBNSender:
             channel: canal não confiável
             window_size: tamanho da janela (N)
             timeout: timeout em segundos
+            sock: socket UDP já vinculado (opcional; dispensa o bind local)
         """
         self.host = host
-        self.port = port
         self.dest_addr = (dest_host, dest_port)
-        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        self.socket.bind((host, port))
+        if sock is None:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sock.bind((host, port))
+        self.socket = sock
+        self.port = sock.getsockname()[1]
         self.socket.settimeout(0.1)  # Timeout curto para verificar periodicamente
         self.channel = channel
         self.logger = setup_logger('GBNSender')
@@ -80,6 +84,8 @@ class GBNSender:
         self.timeout_interval = timeout
         self.timer = None
         self.timer_lock = threading.Lock()
+        # Sinalizado pela thread de ACKs sempre que a base avança
+        self._window_cv = threading.Condition()
         
         # Estatísticas
         self.retransmissions = 0
@@ -198,35 +204,38 @@ class GBNSender:
         if self.start_time is None:
             self.start_time = time.time()
         
-        # Verificar se janela está cheia
-        if self.nextseqnum < self.base + self.N:
-            # Janela não está cheia, pode enviar
-            seqnum = self.nextseqnum
+        # A thread de ACKs só altera base/timer com este lock; sem ele um ACK
+        # pode chegar antes de nextseqnum++ e ser descartado pelo limite defensivo
+        with self._window_cv:
+            # Verificar se janela está cheia
+            if self.nextseqnum < self.base + self.N:
+                # Janela não está cheia, pode enviar
+                seqnum = self.nextseqnum
             
-            # Ação: sndpkt[nextseqnum] = make_pkt(nextseqnum, data, checksum)
-            self.sndpkt[seqnum] = self.make_pkt(seqnum, data, None)
+                # Ação: sndpkt[nextseqnum] = make_pkt(nextseqnum, data, checksum)
+                self.sndpkt[seqnum] = self.make_pkt(seqnum, data, None)
             
-            # Ação: udt_send(sndpkt[nextseqnum])
-            self.udt_send(self.sndpkt[seqnum])
+                # Ação: udt_send(sndpkt[nextseqnum])
+                self.udt_send(self.sndpkt[seqnum])
             
-            self.logger.info(f"[Estado: {self.state}] Pacote seq={seqnum} enviado: {len(data)} bytes (base={self.base}, nextseqnum={self.nextseqnum}, N={self.N})")
-            self.bytes_sent += len(data)
+                self.logger.info(f"[Estado: {self.state}] Pacote seq={seqnum} enviado: {len(data)} bytes (base={self.base}, nextseqnum={self.nextseqnum}, N={self.N})")
+                self.bytes_sent += len(data)
             
-            # Ação: if (base == nextseqnum): start_timer
-            if self.base == self.nextseqnum:
-                self.start_timer()
+                # Ação: if (base == nextseqnum): start_timer
+                if self.base == self.nextseqnum:
+                    self.start_timer()
             
-            # Ação: nextseqnum++
-            self.nextseqnum += 1
+                # Ação: nextseqnum++
+                self.nextseqnum += 1
             
-            # Iniciar thread de recepção de ACKs se necessário
-            self._receive_acks()
+                # Iniciar thread de recepção de ACKs se necessário
+                self._receive_acks()
             
-            return True
-        else:
-            # Janela cheia
-            self.refuse_data(data)
-            return False
+                return True
+            else:
+                # Janela cheia
+                self.refuse_data(data)
+                return False
     
     def _timeout_handler(self):
         """
@@ -241,15 +250,17 @@ class GBNSender:
         """
         self.logger.warning(f"[Estado: {self.state}] Timeout ocorreu, retransmitindo pacotes de {self.base} até {self.nextseqnum-1}")
         
-        # Retransmitir todos os pacotes na janela [base, nextseqnum-1]
-        for seq in range(self.base, self.nextseqnum):
-            if seq in self.sndpkt:
-                self.udt_send(self.sndpkt[seq])
-                self.retransmissions += 1
-                self.logger.debug(f"Retransmitido pacote seq={seq}")
-        
-        # Ação: start_timer
-        self.start_timer()
+        with self._window_cv:
+            # Retransmitir todos os pacotes na janela [base, nextseqnum-1]
+            for seq in range(self.base, self.nextseqnum):
+                if seq in self.sndpkt:
+                    self.udt_send(self.sndpkt[seq])
+                    self.retransmissions += 1
+                    if self.logger.isEnabledFor(logging.DEBUG):
+                        self.logger.debug(f"Retransmitido pacote seq={seq}")
+            
+            # Ação: start_timer
+            self.start_timer()
     
     def _receive_acks(self):
         """Inicia thread para receber ACKs se necessário."""
@@ -277,46 +288,48 @@ class GBNSender:
                 # Evento: rdt_rcv(rcvpkt) && corrupt(rcvpkt)
                 if self.corrupt(rcvpkt):
                     # Ações: nenhuma (descartar)
-                    self.logger.debug(f"[Estado: {self.state}] ACK corrompido recebido, descartando")
+                    if self.logger.isEnabledFor(logging.DEBUG):
+                        self.logger.debug(f"[Estado: {self.state}] ACK corrompido recebido, descartando")
                     continue
                 
                 # Evento: rdt_rcv(rcvpkt) && notcorrupt(rcvpkt)
                 if self.notcorrupt(rcvpkt):
                     ack_num = self.getacknum(rcvpkt)
 
-                    # Ignorar ACKs duplicados ou atrasados que apontam para pacotes já confirmados
-                    if ack_num < self.base - 1:
-                        self.logger.debug(
-                            f"[Estado: {self.state}] ACK duplicado/atrasado recebido (ACK {ack_num}), base atual {self.base}"
-                        )
-                        continue
+                    with self._window_cv:
+                        # Ignorar ACKs duplicados ou atrasados que apontam para pacotes já confirmados
+                        if ack_num < self.base - 1:
+                            self.logger.debug(
+                                f"[Estado: {self.state}] ACK duplicado/atrasado recebido (ACK {ack_num}), base atual {self.base}"
+                            )
+                            continue
 
-                    # Limitar ACK maior do que nextseqnum - 1 (defensivo)
-                    ack_num = min(ack_num, self.nextseqnum - 1)
+                        # Limitar ACK maior do que nextseqnum - 1 (defensivo)
+                        ack_num = min(ack_num, self.nextseqnum - 1)
 
-                    old_base = self.base
-                    self.base = ack_num + 1
-                    
-                    if self.base != old_base:
-                        self.logger.info(
-                            f"[Estado: {self.state}] ACK cumulativo recebido: ACK {ack_num}, base atualizado {old_base} -> {self.base}"
-                        )
-                    else:
-                        self.logger.debug(
-                            f"[Estado: {self.state}] ACK repetido recebido: ACK {ack_num}, base permanece {self.base}"
-                        )
+                        old_base = self.base
+                        self.base = ack_num + 1
+                        if self.base != old_base:
+                            self._window_cv.notify_all()
+                            self.logger.info(
+                                f"[Estado: {self.state}] ACK cumulativo recebido: ACK {ack_num}, base atualizado {old_base} -> {self.base}"
+                            )
+                        else:
+                            self.logger.debug(
+                                f"[Estado: {self.state}] ACK repetido recebido: ACK {ack_num}, base permanece {self.base}"
+                            )
                     
-                    # Remover pacotes confirmados
-                    seqs_to_remove = [s for s in self.sndpkt.keys() if s < self.base]
-                    for s in seqs_to_remove:
-                        del self.sndpkt[s]
+                        # Remover pacotes confirmados
+                        seqs_to_remove = [s for s in self.sndpkt.keys() if s < self.base]
+                        for s in seqs_to_remove:
+                            del self.sndpkt[s]
                     
-                    # Ação: if (base == nextseqnum): stop_timer
-                    if self.base == self.nextseqnum:
-                        self.stop_timer()
-                    else:
-                        # Senão: start_timer
-                        self.start_timer()
+                        # Ação: if (base == nextseqnum): stop_timer
+                        if self.base == self.nextseqnum:
+                            self.stop_timer()
+                        else:
+                            # Senão: start_timer
+                            self.start_timer()
                     
             except socket.timeout:
                 continue
@@ -328,19 +341,53 @@ class GBNSender:
         """Alias para rdt_send para compatibilidade."""
         return self.rdt_send(data)
     
+    def has_slot(self):
+        """Indica se há espaço na janela (nextseqnum < base + N)."""
+        return self.nextseqnum < self.base + self.N
+    
+    def all_acked(self):
+        """Indica se todos os pacotes enviados já foram confirmados."""
+        return self.base >= self.nextseqnum
+    
+    def wait_window(self, predicate, timeout=None):
+        """
+        Bloqueia até predicate() ser verdadeiro, reavaliando a cada avanço da base.
+        
+        Returns:
+            True se a condição foi satisfeita, False se o timeout expirou antes
+        """
+        with self._window_cv:
+            return self._window_cv.wait_for(predicate, timeout)
+    
+    def wait_for_slot(self, timeout=None):
+        """
+        Bloqueia até haver espaço na janela (nextseqnum < base + N).
+        
+        Returns:
+            True se há vaga, False se o timeout expirou antes
+        """
+        return self.wait_window(self.has_slot, timeout)
+    
+    def send_blocking(self, data, timeout=None):
+        """Envia os dados aguardando vaga na janela em vez de recusá-los."""
+        if not self.wait_for_slot(timeout):
+            return False
+        return self.rdt_send(data)
+    
     def wait_for_all_acks(self, timeout=30):
         """Aguarda todos os ACKs serem recebidos."""
-        start = time.time()
-        while self.base < self.nextseqnum:
-            if time.time() - start > timeout:
-                self.logger.warning("Timeout aguardando todos os ACKs")
-                break
-            time.sleep(0.1)
+        if not self.wait_window(self.all_acked, timeout):
+            self.logger.warning("Timeout aguardando todos os ACKs")
     
     def get_retransmissions(self):
         """Retorna número de retransmissões."""
         return self.retransmissions
     
+    def get_throughput_mbps(self):
+        """Retorna apenas o throughput (Mbps) desde o primeiro envio, sem montar o dicionário de get_stats()."""
+        total_time = time.time() - self.start_time if self.start_time else 0
+        return (self.bytes_sent * 8) / total_time / 1_000_000 if total_time > 0 else 0.0
+    
     def get_stats(self):
         """Retorna estatísticas de envio."""
         end_time = time.time()
@@ -358,6 +405,32 @@ class GBNSender:
             'nextseqnum': self.nextseqnum
         }
     
+    def reset_stats(self):
+        """Zera os contadores para reaproveitar o remetente em uma nova execução."""
+        self.retransmissions = 0
+        self.bytes_sent = 0
+        self.start_time = None
+        self.window_full_logs = 0
+    
+    def reset_state(self, window_size=None):
+        """
+        Volta às condições iniciais da Figura 3.20 (base = nextseqnum = 0),
+        mantendo socket e thread de ACKs; window_size, se dado, troca N.
+        
+        Só é seguro com todos os pacotes confirmados e num canal sem atraso
+        (channel.is_reliable, como DirectChannel): a numeração recomeça em 0
+        no mesmo socket, e um ACK atrasado da execução anterior que chegasse
+        depois confirmaria falsamente o novo pacote 0.
+        """
+        self.stop_timer()
+        with self._window_cv:
+            self.base = 0
+            self.nextseqnum = 0
+            self.sndpkt.clear()
+            if window_size is not None:
+                self.N = window_size
+        self.reset_stats()
+    
     def get_state(self):
         """Retorna o estado atual do FSM."""
         return self.state
@@ -379,7 +452,7 @@ class GBNReceiver:
     # Estado do FSM
     WAIT = "Esperar"
     
-    def __init__(self, host='localhost', port=6001, channel=None):
+    def __init__(self, host='localhost', port=6001, channel=None, sock=None):
         """
         Inicializa o receptor GBN.
         
@@ -387,11 +460,14 @@ class GBNReceiver:
             host: endereço local
             port: porta local
             channel: canal não confiável
+            sock: socket UDP já vinculado (opcional; dispensa o bind local)
         """
         self.host = host
-        self.port = port
-        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        self.socket.bind((host, port))
+        if sock is None:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sock.bind((host, port))
+        self.socket = sock
+        self.port = sock.getsockname()[1]
         self.channel = channel
         self.logger = setup_logger('GBNReceiver')
         
@@ -569,6 +645,24 @@ class GBNReceiver:
             'expectedseqnum': self.expectedseqnum
         }
     
+    def reset_stats(self):
+        """Zera os contadores para reaproveitar o receptor em uma nova execução."""
+        self.messages = []
+        self.received_count = 0
+        self.corrupted_count = 0
+        self.out_of_order_count = 0
+    
+    def reset_state(self):
+        """
+        Volta às condições iniciais da Figura 3.21 (expectedseqnum = 0), mantendo o socket.
+        
+        Mesma condição de GBNSender.reset_state: só num canal sem atraso, para
+        que nenhum DATA da execução anterior chegue depois do reinício.
+        """
+        self.expectedseqnum = 0
+        self.sndpkt = self.make_pkt(0, Packet.TYPE_ACK, None)
+        self.reset_stats()
+    
     def get_state(self):
         """Retorna o estado atual do FSM."""
         return self.state
@@ -3,11 +3,13 @@ Implementação de TCP Simplificado sobre UDP.
 Referência: Seção 3.5 - Kurose & Ross
 """
 import socket
+import logging
 import sys
 import os
 import threading
 import time
-import random
+import secrets
+import selectors
 import queue
 from collections import deque
 
@@ -17,6 +19,65 @@ from utils.packet import TCPSegment
 from utils.logger import setup_logger
 
 
+class _Demuxer:
+    """
+    Demultiplexador de recepção compartilhado entre sockets.
+    
+    Uma única thread espera (epoll/select) por todos os sockets UDP
+    registrados e entrega cada datagrama ao SimpleTCPSocket dono do
+    descritor, em vez de uma thread de recepção por conexão.
+    """
+    
+    _instance = None
+    _instance_lock = threading.Lock()
+    
+    def __init__(self):
+        self.selector = selectors.DefaultSelector()
+        self.sockets = {}  # {fd: SimpleTCPSocket}
+        self.lock = threading.Lock()
+        self.thread = None
+    
+    @classmethod
+    def instance(cls):
+        """Retorna o demultiplexador do processo (criado sob demanda)."""
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+    
+    def register(self, tcp_socket):
+        """Passa a entregar os datagramas de tcp_socket ao seu _process_segment."""
+        fd = tcp_socket.udp_socket.fileno()
+        with self.lock:
+            if fd in self.sockets:
+                return
+            self.sockets[fd] = tcp_socket
+            self.selector.register(tcp_socket.udp_socket, selectors.EVENT_READ, tcp_socket)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._loop, daemon=True)
+                self.thread.start()
+    
+    def unregister(self, tcp_socket):
+        """Remove tcp_socket (deve ser chamado antes de fechar o socket UDP)."""
+        with self.lock:
+            fd = tcp_socket.udp_socket.fileno()
+            if self.sockets.get(fd) is not tcp_socket:
+                return
+            del self.sockets[fd]
+            self.selector.unregister(tcp_socket.udp_socket)
+    
+    def _loop(self):
+        """Thread de recepção; termina quando não há sockets registrados."""
+        select = self.selector.select
+        while True:
+            with self.lock:
+                if not self.sockets:
+                    self.thread = None
+                    return
+            for key, _ in select(timeout=0.1):
+                key.data._receive_ready()
+
+
 class SimpleTCPSocket:
     """
     Socket TCP simplificado sobre UDP.
@@ -40,7 +101,11 @@ class SimpleTCPSocket:
     # Tamanhos padrão
     DEFAULT_RECV_WINDOW = 4096
     MAX_SEGMENT_SIZE = 1024
-    INITIAL_TIMEOUT = 2.0
+    INITIAL_TIMEOUT = 1.0  # RTO antes da primeira amostra (RFC 6298, 2.1)
+    MIN_TIMEOUT = 0.2      # piso do RTO (o 1 s da RFC é lento demais para loopback)
+    MAX_TIMEOUT = 60.0     # teto do RTO com backoff (RFC 6298, 2.5)
+    DELAYED_ACK_TIMEOUT = 0.2
+    SOCKET_BUFFER_SIZE = 4 * 1024 * 1024  # SO_RCVBUF/SO_SNDBUF pedidos (o kernel limita a rmem_max/wmem_max)
     
     def __init__(self, port, host='localhost'):
         """
@@ -53,6 +118,10 @@ class SimpleTCPSocket:
         self.port = port
         self.host = host
         self.udp_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        # Buffers maiores: rajadas não são descartadas pelo kernel quando a
+        # thread de recepção atrasa (o descarte viraria retransmissão)
+        self.udp_socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.SOCKET_BUFFER_SIZE)
+        self.udp_socket.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, self.SOCKET_BUFFER_SIZE)
         self.udp_socket.bind((host, port))
         self.udp_socket.settimeout(0.1)
         
@@ -60,7 +129,7 @@ class SimpleTCPSocket:
         self.state = self.CLOSED
         
         # Números de sequência e ACK
-        self.seq_num = random.randint(0, 10000)  # ISN (Initial Sequence Number)
+        self.seq_num = self._generate_isn()  # ISN (Initial Sequence Number)
         self.ack_num = 0
         self.send_base = self.seq_num  # Base do buffer de envio
         
@@ -70,14 +139,21 @@ class SimpleTCPSocket:
         self.recv_buffer_lock = threading.Lock()
         self.send_buffer_lock = threading.Lock()
         
+        # Buffer de transmissão reutilizado por _send_data (protegido por send_buffer_lock)
+        self._tx_scratch = bytearray(20 + self.MAX_SEGMENT_SIZE)
+        self._tx_view = memoryview(self._tx_scratch)
+        
         # Controle de fluxo
         self.recv_window = self.DEFAULT_RECV_WINDOW
         self.send_window = self.DEFAULT_RECV_WINDOW
         
-        # Controle de tempo (RTT)
+        # Controle de tempo (RTT); estimated_rtt/dev_rtt só valem após a primeira amostra
         self.estimated_rtt = 1.0
         self.dev_rtt = 0.5
+        self._rtt_sampled = False
         self.timeout_interval = self.INITIAL_TIMEOUT
+        self._rto_backoff = 1  # dobra a cada timeout, volta a 1 com nova amostra válida
+        self._syn_sent_at = None  # envio do SYN/SYN-ACK, primeira amostra de RTT
         
         # Dados do peer
         self.peer_address = None
@@ -87,12 +163,18 @@ class SimpleTCPSocket:
         self.timers = {}  # {seq_num: timer}
         self.timer_lock = threading.Lock()
         
+        # ACK atrasado
+        self._pending_ack = False
+        self._delayed_ack_timer = None
+        
+        # Último ACK puro montado: ((seq, ack, janela, porta), segmento)
+        self._last_ack = (None, None)
+        
         # Rastreamento de RTT
-        self.send_times = {}  # {seq_num: timestamp} - para calcular SampleRTT
+        self.send_times = {}  # {seq_num: timestamp} - para calcular SampleRTT (protegido por send_buffer_lock)
         self.unacked_segments = {}  # {seq_num: data} - segmentos aguardando ACK
         
-        # Threads
-        self.receive_thread = None
+        # Recepção (thread compartilhada via _Demuxer)
         self.running = False
         
         # Estatísticas
@@ -106,20 +188,49 @@ class SimpleTCPSocket:
         
         self.logger = setup_logger('SimpleTCPSocket')
         self._send_interceptor = None
+        # Sem interceptor, envia direto pelo socket UDP (sem desvio por pacote)
+        self._raw_send = self.udp_socket.sendto
+        self._udp_send = self._raw_send
+    
+    @staticmethod
+    def _generate_isn():
+        """
+        Gera ISN aleatório de 31 bits.
+        
+        Usa secrets (os.urandom), sem disputar o lock do gerador global de
+        random; 31 bits deixam folga para o número de sequência de 32 bits.
+        """
+        return secrets.randbits(31)
     
     def set_send_interceptor(self, interceptor):
         """
         Define função para interceptar envios UDP (usado em testes).
         
-        interceptor(data, dest, send_func) deve decidir se envia ou descarta.
+        interceptor(data, parsed, dest, send_func) deve decidir se envia ou descarta.
+        data é sempre bytes (uma cópia própria, que pode ser guardada).
+        Em segmentos de dados, parsed é o cabeçalho já conhecido pelo emissor
+        (dict no formato de TCPSegment.parse_segment); em segmentos de
+        controle é None e o interceptor pode parsear data.
+        Com interceptor=None, _udp_send volta a ser o sendto do socket.
         """
         self._send_interceptor = interceptor
+        if interceptor:
+            sendto = self._raw_send
+            self._udp_send = lambda data, dest: interceptor(data, None, dest, sendto)
+        else:
+            self._udp_send = self._raw_send
     
-    def _udp_send(self, data, dest):
-        """Envia segmento via UDP aplicando interceptor se configurado."""
-        if self._send_interceptor:
-            return self._send_interceptor(data, dest, self.udp_socket.sendto)
-        return self.udp_socket.sendto(data, dest)
+    def _data_header(self, seq_num, data, flags=TCPSegment.FLAG_ACK):
+        """Cabeçalho de um segmento de dados, entregue ao interceptor sem reparsear."""
+        return {
+            'src_port': self.port,
+            'dst_port': self.peer_port,
+            'seq_num': seq_num,
+            'ack_num': self.ack_num,
+            'flags': flags,
+            'window_size': self.recv_window,
+            'data': data,
+        }
     
     def connect(self, dest_address):
         """
@@ -135,13 +246,12 @@ class SimpleTCPSocket:
             self.peer_address = dest_address[0]
             self.peer_port = dest_address[1]
         
-        # Iniciar thread de recepção
+        # Registrar na thread de recepção compartilhada
         self.running = True
-        self.receive_thread = threading.Thread(target=self._receive_loop, daemon=True)
-        self.receive_thread.start()
+        _Demuxer.instance().register(self)
         
         # Enviar SYN
-        self.logger.info(f"Iniciando conexão com {dest_address}")
+        self.logger.info("Iniciando conexão com %s", dest_address)
         segment = TCPSegment.create_segment(
             src_port=self.port,
             dst_port=self.peer_port,
@@ -151,8 +261,9 @@ class SimpleTCPSocket:
             window_size=self.recv_window,
             data=b''
         )
+        self._syn_sent_at = time.time()
         self._udp_send(segment, dest_address)
-        self.logger.info(f"SYN enviado (seq={self.seq_num})")
+        self.logger.info("SYN enviado (seq=%d)", self.seq_num)
         
         # Aguardar SYN-ACK (com timeout)
         start_time = time.time()
@@ -180,10 +291,9 @@ class SimpleTCPSocket:
             self.state = self.LISTEN
         
         self.running = True
-        self.receive_thread = threading.Thread(target=self._receive_loop, daemon=True)
-        self.receive_thread.start()
+        _Demuxer.instance().register(self)
         
-        self.logger.info(f"Socket em modo de escuta na porta {self.port}")
+        self.logger.info("Socket em modo de escuta na porta %d", self.port)
     
     def accept(self):
         """
@@ -249,21 +359,35 @@ class SimpleTCPSocket:
                 segment_size = min(len(data), self.MAX_SEGMENT_SIZE, available_window)
                 segment_data = data[:segment_size]
                 
-                # Criar segmento
+                # PSH no segmento que esvazia o buffer de envio: o receptor confirma na hora
+                flags = TCPSegment.FLAG_ACK
+                if segment_size == len(data) and not self.send_buffer:
+                    flags |= TCPSegment.FLAG_PSH
+                
+                # Criar segmento no buffer de transmissão reutilizável
                 current_seq = self.seq_num
-                segment = TCPSegment.create_segment(
+                length = TCPSegment.build_into(
+                    self._tx_scratch,
                     src_port=self.port,
                     dst_port=self.peer_port,
                     seq_num=current_seq,
                     ack_num=self.ack_num,
-                    flags=TCPSegment.FLAG_ACK,
+                    flags=flags,
                     window_size=self.recv_window,
                     data=segment_data
                 )
                 
-                # Enviar
-                self._udp_send(segment, (self.peer_address, self.peer_port))
-                self.logger.debug(f"Segmento enviado: seq={current_seq}, len={len(segment_data)}")
+                # Enviar (sendto copia os bytes antes de retornar)
+                interceptor = self._send_interceptor
+                if interceptor is None:
+                    self._udp_send(self._tx_view[:length], (self.peer_address, self.peer_port))
+                else:
+                    # O interceptor pode guardar ou atrasar o segmento: recebe uma
+                    # cópia em bytes, não a view do buffer reutilizado
+                    interceptor(bytes(self._tx_view[:length]), self._data_header(current_seq, segment_data, flags),
+                                (self.peer_address, self.peer_port), self._raw_send)
+                if self.logger.isEnabledFor(logging.DEBUG):
+                    self.logger.debug("Segmento enviado: seq=%d, len=%d", current_seq, len(segment_data))
                 
                 # Guardar cópia para possível retransmissão
                 self.unacked_segments[current_seq] = segment_data
@@ -319,28 +443,65 @@ class SimpleTCPSocket:
                 return b''
             time.sleep(0.1)
     
-    def _receive_loop(self):
-        """Thread que recebe segmentos UDP e processa."""
-        while self.running:
-            try:
-                segment, addr = self.udp_socket.recvfrom(2048)
-                parsed = TCPSegment.parse_segment(segment)
-                
-                if not parsed:
-                    continue
-                
-                # Atualizar endereço do peer se necessário
-                if not self.peer_address:
-                    self.peer_address = addr[0]
-                    self.peer_port = parsed['dst_port']
-                
-                self._process_segment(parsed, addr)
-                
-            except socket.timeout:
-                continue
-            except Exception as e:
-                if self.running:
-                    self.logger.error(f"Erro no loop de recepção: {e}")
+    def recv_into(self, buffer, nbytes=0):
+        """
+        Recebe dados direto num buffer já alocado (sem criar bytes intermediários).
+        
+        Args:
+            buffer: buffer gravável (bytearray, memoryview)
+            nbytes: máximo de bytes a copiar (0 = tamanho do buffer)
+        
+        Returns:
+            número de bytes copiados (0 após 5s sem dados ou fora de conexão)
+        """
+        if self.state != self.ESTABLISHED and self.state != self.CLOSE_WAIT:
+            return 0
+        
+        view = memoryview(buffer).cast('B')
+        limit = nbytes or len(view)
+        timeout_start = time.time()
+        while True:
+            with self.recv_buffer_lock:
+                if self.recv_buffer:
+                    total = 0
+                    while self.recv_buffer and total < limit:
+                        chunk = self.recv_buffer.popleft()
+                        needed = limit - total
+                        if len(chunk) <= needed:
+                            view[total:total + len(chunk)] = chunk
+                            total += len(chunk)
+                        else:
+                            view[total:limit] = chunk[:needed]
+                            total = limit
+                            self.recv_buffer.appendleft(chunk[needed:])
+                    self.bytes_received += total
+                    return total
+            
+            if time.time() - timeout_start > 5:
+                return 0
+            time.sleep(0.1)
+    
+    def _receive_ready(self):
+        """Lê e processa um segmento UDP disponível (chamado pelo _Demuxer)."""
+        try:
+            segment, addr = self.udp_socket.recvfrom(2048)
+            parsed = TCPSegment.parse_segment(segment)
+            
+            if not parsed:
+                return
+            
+            # Atualizar endereço do peer se necessário
+            if not self.peer_address:
+                self.peer_address = addr[0]
+                self.peer_port = parsed['dst_port']
+            
+            self._process_segment(parsed, addr)
+            
+        except socket.timeout:
+            return
+        except Exception as e:
+            if self.running:
+                self.logger.error("Erro no loop de recepção: %s", e)
     
     def _process_segment(self, segment, addr):
         """Processa um segmento TCP recebido."""
@@ -363,7 +524,7 @@ class SimpleTCPSocket:
         
         # Processar dados
         if data and (flags & TCPSegment.FLAG_ACK):
-            self._handle_data(seq_num, data)
+            self._handle_data(seq_num, data, flags & TCPSegment.FLAG_PSH)
     
     def _handle_syn(self, segment, addr):
         """Trata segmento SYN."""
@@ -372,7 +533,7 @@ class SimpleTCPSocket:
             self.peer_address = addr[0]
             self.peer_port = segment['src_port']
             self.ack_num = segment['seq_num'] + 1
-            self.seq_num = random.randint(0, 10000)
+            self.seq_num = self._generate_isn()
             
             syn_ack = TCPSegment.create_segment(
                 src_port=self.port,
@@ -383,16 +544,19 @@ class SimpleTCPSocket:
                 window_size=self.recv_window,
                 data=b''
             )
+            self._syn_sent_at = time.time()
             self._udp_send(syn_ack, (self.peer_address, self.peer_port))
             
             with self.state_lock:
                 self.state = self.SYN_RCVD
-            self.logger.info(f"SYN-ACK enviado (seq={self.seq_num}, ack={self.ack_num})")
+            self.logger.info("SYN-ACK enviado (seq=%d, ack=%d)", self.seq_num, self.ack_num)
         
         elif self.state == self.SYN_SENT:
             # Recebido SYN-ACK, enviar ACK
             self.ack_num = segment['seq_num'] + 1
             self.seq_num += 1  # Incrementar seq_num após enviar SYN
+            self.send_base = self.seq_num  # SYN confirmado pelo SYN-ACK
+            self._sample_handshake_rtt()
             
             ack = TCPSegment.create_segment(
                 src_port=self.port,
@@ -407,7 +571,7 @@ class SimpleTCPSocket:
             
             with self.state_lock:
                 self.state = self.ESTABLISHED
-            self.logger.info(f"ACK final enviado, conexão estabelecida")
+            self.logger.info("ACK final enviado, conexão estabelecida")
     
     def _handle_ack(self, ack_num):
         """Trata ACK recebido."""
@@ -418,6 +582,7 @@ class SimpleTCPSocket:
                     self.state = self.ESTABLISHED
                 self.seq_num = ack_num
                 self.send_base = ack_num
+                self._sample_handshake_rtt()
                 self.logger.info("ACK final recebido pelo servidor, conexão estabelecida")
                 return
         
@@ -426,19 +591,34 @@ class SimpleTCPSocket:
             # O ACK confirma todos os bytes até ack_num-1
             # Procurar o timestamp do segmento mais recente que foi completamente confirmado
             current_time = time.time()
-            for seq in sorted(self.send_times.keys(), reverse=True):
-                if seq < ack_num and seq in self.send_times:
-                    # Calcular SampleRTT
-                    sample_rtt = current_time - self.send_times[seq]
-                    if sample_rtt > 0:
-                        # Atualizar estimativa de RTT
-                        self._update_rtt(sample_rtt)
-                        self.logger.debug(f"RTT atualizado: SampleRTT={sample_rtt:.3f}s, EstimatedRTT={self.estimated_rtt:.3f}s, Timeout={self.timeout_interval:.3f}s")
+            send_times = self.send_times
+            # send_times também é escrito por _send_data e pelo timer (Karn): lê e
+            # remove sob send_buffer_lock
+            with self.send_buffer_lock:
+                # Maior seq confirmado: O(W) em vez de ordenar todos os timestamps
+                seq = max((s for s in send_times if s < ack_num), default=None)
+                sample_rtt = None
+                if seq is not None:
+                    sample_rtt = current_time - send_times[seq]
                     # Remover timestamps confirmados
-                    seqs_to_remove = [s for s in self.send_times.keys() if s < ack_num]
-                    for s in seqs_to_remove:
-                        del self.send_times[s]
-                    break
+                    for s in [s for s in send_times if s < ack_num]:
+                        del send_times[s]
+            if sample_rtt is not None:
+                # Calcular SampleRTT
+                if sample_rtt > 0:
+                    # Atualizar estimativa de RTT
+                    self._update_rtt(sample_rtt)
+                    if self.logger.isEnabledFor(logging.DEBUG):
+                        self.logger.debug(
+                            "RTT atualizado: SampleRTT=%.3fs, EstimatedRTT=%.3fs, Timeout=%.3fs",
+                            sample_rtt, self.estimated_rtt, self.timeout_interval
+                        )
+            
+            # ACK de dados novos mostra que o caminho voltou a entregar: desfaz o
+            # backoff mesmo sem amostra válida (os segmentos confirmados podem ser
+            # todos retransmitidos, que Karn não amostra). Sem isso, com perdas
+            # aleatórias e Go-Back-N o RTO só cresceria.
+            self._rto_backoff = 1
             
             # Atualizar base do buffer de envio
             old_base = self.send_base
@@ -452,7 +632,8 @@ class SimpleTCPSocket:
                         self.timers[s].cancel()
                         del self.timers[s]
             
-            self.logger.debug(f"ACK recebido: ack={ack_num}, base atualizado {old_base} -> {self.send_base}")
+            if self.logger.isEnabledFor(logging.DEBUG):
+                self.logger.debug("ACK recebido: ack=%d, base atualizado %d -> %d", ack_num, old_base, self.send_base)
             
             # Remover segmentos confirmados do buffer de não confirmados
             with self.send_buffer_lock:
@@ -463,30 +644,37 @@ class SimpleTCPSocket:
             # Tentar enviar mais dados
             self._send_data()
     
-    def _handle_data(self, seq_num, data):
-        """Trata dados recebidos."""
+    def _handle_data(self, seq_num, data, push=False):
+        """Trata dados recebidos (push: segmento com PSH, confirmado sem atraso)."""
         if seq_num == self.ack_num:
             # Dados em ordem
             with self.recv_buffer_lock:
                 self.recv_buffer.append(data)
             self.ack_num += len(data)
             
-            # Enviar ACK
-            ack = TCPSegment.create_segment(
-                src_port=self.port,
-                dst_port=self.peer_port,
-                seq_num=self.seq_num,
-                ack_num=self.ack_num,
-                flags=TCPSegment.FLAG_ACK,
-                window_size=self.recv_window,
-                data=b''
-            )
-            self._udp_send(ack, (self.peer_address, self.peer_port))
-            self.logger.debug(f"Dados recebidos: {len(data)} bytes, ACK enviado (ack={self.ack_num})")
+            # ACK atrasado: confirma a cada 2 segmentos, com PSH ou após DELAYED_ACK_TIMEOUT
+            self._ack_in_order_data(push)
+            if self.logger.isEnabledFor(logging.DEBUG):
+                self.logger.debug("Dados recebidos: %d bytes (ack=%d)", len(data), self.ack_num)
         else:
             # Dados fora de ordem (simplificado: descarta)
-            self.logger.warning(f"Dados fora de ordem recebidos (seq={seq_num}, esperado={self.ack_num})")
-            # Reenviar ACK do último byte recebido em ordem
+            self.logger.warning("Dados fora de ordem recebidos (seq=%d, esperado=%d)", seq_num, self.ack_num)
+            # Reenviar ACK do último byte recebido em ordem (imediato, cobre ACK pendente)
+            with self.timer_lock:
+                self._clear_delayed_ack()
+            self._send_ack()
+    
+    def _send_ack(self):
+        """
+        Envia ACK puro com o ack_num atual.
+        
+        O checksum do segmento é MD5 (não soma em complemento de um), então
+        não há atualização incremental; em vez disso o último ACK montado é
+        reaproveitado enquanto seq/ack/janela não mudam (ACKs duplicados).
+        """
+        key = (self.seq_num, self.ack_num, self.recv_window, self.peer_port)
+        last_key, ack = self._last_ack
+        if key != last_key:
             ack = TCPSegment.create_segment(
                 src_port=self.port,
                 dst_port=self.peer_port,
@@ -496,13 +684,52 @@ class SimpleTCPSocket:
                 window_size=self.recv_window,
                 data=b''
             )
-            self._udp_send(ack, (self.peer_address, self.peer_port))
+            self._last_ack = (key, ack)
+        self._udp_send(ack, (self.peer_address, self.peer_port))
+    
+    def _ack_in_order_data(self, push=False):
+        """
+        ACK atrasado (RFC 1122, seção 4.2.3.2).
+        
+        O primeiro segmento em ordem apenas arma o timer de ACK atrasado;
+        o segundo força o envio imediato de um ACK cumulativo. Segmentos com
+        PSH (fim de uma rajada do emissor) e janelas menores que 2 MSS (o
+        emissor só tem um segmento em voo e ficaria parado esperando o timer,
+        RFC 813) são confirmados imediatamente.
+        """
+        immediate = push or self.recv_window < 2 * self.MAX_SEGMENT_SIZE
+        with self.timer_lock:
+            if not self._pending_ack and not immediate:
+                self._pending_ack = True
+                self._delayed_ack_timer = threading.Timer(self.DELAYED_ACK_TIMEOUT, self._flush_delayed_ack)
+                self._delayed_ack_timer.start()
+                return
+            self._clear_delayed_ack()
+        self._send_ack()
+    
+    def _clear_delayed_ack(self):
+        """Descarta ACK atrasado pendente (chamar com timer_lock adquirido)."""
+        self._pending_ack = False
+        if self._delayed_ack_timer:
+            self._delayed_ack_timer.cancel()
+            self._delayed_ack_timer = None
+    
+    def _flush_delayed_ack(self):
+        """Envia o ACK atrasado pendente, se houver."""
+        with self.timer_lock:
+            if not self._pending_ack:
+                return
+            self._clear_delayed_ack()
+        if self.running:
+            self._send_ack()
     
     def _handle_fin(self, segment, addr):
         """Trata segmento FIN."""
         if self.state == self.ESTABLISHED:
-            # Recebido FIN, enviar ACK
+            # Recebido FIN, enviar ACK (cobre qualquer ACK atrasado pendente)
             self.ack_num = segment['seq_num'] + 1
+            with self.timer_lock:
+                self._clear_delayed_ack()
             
             ack = TCPSegment.create_segment(
                 src_port=self.port,
@@ -524,6 +751,9 @@ class SimpleTCPSocket:
         if self.state == self.CLOSED:
             return
         
+        # Não deixar ACK atrasado pendurado após o encerramento
+        self._flush_delayed_ack()
+        
         if self.state == self.ESTABLISHED:
             # Enviar FIN
             fin = TCPSegment.create_segment(
@@ -576,6 +806,7 @@ class SimpleTCPSocket:
         time.sleep(1)
         
         self.running = False
+        _Demuxer.instance().unregister(self)
         with self.state_lock:
             self.state = self.CLOSED
         
@@ -584,6 +815,7 @@ class SimpleTCPSocket:
             for timer in self.timers.values():
                 timer.cancel()
             self.timers.clear()
+            self._clear_delayed_ack()
         
         self.udp_socket.close()
         self.logger.info("Conexão encerrada")
@@ -594,25 +826,41 @@ class SimpleTCPSocket:
             if seq_num in self.timers:
                 self.timers[seq_num].cancel()
             
-            timer = threading.Timer(self.timeout_interval, self._timeout_handler, args=(seq_num,))
+            timeout = min(self.timeout_interval * self._rto_backoff, self.MAX_TIMEOUT)
+            timer = threading.Timer(timeout, self._timeout_handler, args=(seq_num,))
             timer.start()
             self.timers[seq_num] = timer
     
     def _timeout_handler(self, seq_num):
         """Handler chamado quando timer expira."""
-        self.logger.warning(f"Timeout para segmento seq={seq_num}, retransmitindo...")
-        self.retransmissions += 1
+        with self.timer_lock:
+            # Timers da mesma rajada expiram juntos: só o que ainda está registrado
+            # vale, e ele recolhe os demais (todos serão retransmitidos), para que
+            # uma perda conte como um único timeout (e um único backoff)
+            if self.timers.get(seq_num) is not threading.current_thread():
+                return
+            for timer in self.timers.values():
+                timer.cancel()
+            self.timers.clear()
+            # Backoff exponencial do RTO (RFC 6298, 5.5), limitado a MAX_TIMEOUT
+            if self.timeout_interval * self._rto_backoff < self.MAX_TIMEOUT:
+                self._rto_backoff *= 2
         
-        # Não atualizar RTT em caso de timeout (timeout indica que o segmento foi perdido)
-        # Remover timestamp antigo (se existir) para evitar cálculos incorretos
-        if seq_num in self.send_times:
-            # Não remover, mas marcar para não usar esse SampleRTT
-            # (em implementação mais sofisticada, poderia usar Karn's algorithm)
-            pass
+        self.logger.warning("Timeout para segmento seq=%d, retransmitindo...", seq_num)
+        self.retransmissions += 1
         
-        # Retransmitir todos os segmentos não confirmados a partir de seq_num (Go-Back-N)
+        # Retransmitir todos os segmentos não confirmados (Go-Back-N). Os timers
+        # não expiram em ordem de seq (o backoff muda entre um envio e outro), e o
+        # receptor só aceita a partir de send_base
         with self.send_buffer_lock:
-            pending = [(seq, data) for seq, data in self.unacked_segments.items() if seq >= seq_num]
+            pending = list(self.unacked_segments.items())
+            # Karn: segmento retransmitido não gera amostra de RTT (ACK ambíguo). Os
+            # timestamps saem antes do primeiro reenvio, pois o ACK dele pode chegar
+            # enquanto o restante ainda está sendo retransmitido; send_buffer_lock
+            # é o mesmo usado por _handle_ack ao ler send_times
+            send_times = self.send_times
+            for seq, _ in pending:
+                send_times.pop(seq, None)
         
         if not pending:
             return
@@ -627,20 +875,44 @@ class SimpleTCPSocket:
                 window_size=self.recv_window,
                 data=data
             )
-            self._udp_send(segment, (self.peer_address, self.peer_port))
-            self.logger.debug(f"Segmento retransmitido: seq={seq}, len={len(data)}")
-            self.send_times[seq] = time.time()
+            interceptor = self._send_interceptor
+            if interceptor is None:
+                self._udp_send(segment, (self.peer_address, self.peer_port))
+            else:
+                interceptor(segment, self._data_header(seq, data),
+                            (self.peer_address, self.peer_port), self._raw_send)
+            if self.logger.isEnabledFor(logging.DEBUG):
+                self.logger.debug("Segmento retransmitido: seq=%d, len=%d", seq, len(data))
             self._start_timer(seq)
     
+    def _sample_handshake_rtt(self):
+        """
+        Usa o handshake como primeira amostra de RTT (RFC 6298, 2.2).
+        
+        Sem ela o RTO fica no valor inicial até algum segmento de dados ser
+        confirmado sem retransmissão, o que com perdas (e Karn) pode demorar.
+        """
+        if self._syn_sent_at is not None:
+            self._update_rtt(time.time() - self._syn_sent_at)
+            self._syn_sent_at = None
+    
     def _calculate_timeout(self):
-        """Calcula timeout baseado em RTT."""
-        return self.estimated_rtt + 4 * self.dev_rtt
+        """Calcula timeout baseado em RTT (RTO = SRTT + 4*RTTVAR, com piso)."""
+        return max(self.MIN_TIMEOUT, self.estimated_rtt + 4 * self.dev_rtt)
     
     def _update_rtt(self, sample_rtt):
-        """Atualiza estimativa de RTT."""
-        self.estimated_rtt = 0.875 * self.estimated_rtt + 0.125 * sample_rtt
-        self.dev_rtt = 0.75 * self.dev_rtt + 0.25 * abs(sample_rtt - self.estimated_rtt)
+        """Atualiza estimativa de RTT (RFC 6298, seção 2)."""
+        if not self._rtt_sampled:
+            # Primeira amostra: SRTT = R, RTTVAR = R/2
+            self.estimated_rtt = sample_rtt
+            self.dev_rtt = sample_rtt / 2
+            self._rtt_sampled = True
+        else:
+            # RTTVAR usa o SRTT anterior à atualização
+            self.dev_rtt = 0.75 * self.dev_rtt + 0.25 * abs(self.estimated_rtt - sample_rtt)
+            self.estimated_rtt = 0.875 * self.estimated_rtt + 0.125 * sample_rtt
         self.timeout_interval = self._calculate_timeout()
+        self._rto_backoff = 1
     
     def get_stats(self):
         """Retorna estatísticas da conexão."""
@@ -1,52 +1,126 @@
+import atexit
 import logging
+import logging.handlers
 import os
-import random
+import queue
 import socket
+import struct
 import sys
 import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from fase1.rdt20 import RDT20Sender, RDT20Receiver
 from fase1.rdt21 import RDT21Sender, RDT21Receiver
 from fase1.rdt30 import RDT30Sender, RDT30Receiver
-from collections import defaultdict
 
-from utils.packet import Packet, RDT20Packet, RDT21Packet
+from utils.packet import Packet, RDT20Packet
 from utils.simulator import DirectChannel, UnreliableChannel
 
+# Os canais de teste só precisam do byte de tipo (e, no rdt2.1/3.0, do seq_num);
+# o offset evita o parse completo com verificação de checksum por pacote.
+_RDT20_HEADER_SIZE = struct.calcsize(RDT20Packet.FORMAT)
+_TYPE_DATA = Packet.TYPE_DATA
+_TYPE_ACK = Packet.TYPE_ACK
+
+
+# Progresso dos laços de envio/recepção: os registros vão para uma fila e são
+# escritos no stdout por uma thread dedicada, fora do caminho das threads rdt.
+log = logging.getLogger("testes.fase1")
+_LOG_QUEUE = queue.SimpleQueue()
+_log_listener = None
+
+# Nível aplicado por último: cenários seguidos no menu não reconfiguram à toa
+_LOGGING_STATE = {"level": None}
+_PACKET_LOGGER = logging.getLogger("utils.packet")
+
 
 def _configure_logging(level=logging.INFO):
     """Configura logging global para os testes."""
+    global _log_listener
+    if _LOGGING_STATE["level"] == level:
+        return
+    _LOGGING_STATE["level"] = level
     logging.basicConfig(
         level=level,
         format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
         force=True,
     )
+    # Logs de checksum ficam em INFO mesmo quando o root está em DEBUG
+    _PACKET_LOGGER.setLevel(logging.INFO)
+    if _log_listener is None:
+        console = logging.StreamHandler(sys.stdout)
+        console.setFormatter(logging.Formatter("%(message)s"))
+        _log_listener = logging.handlers.QueueListener(_LOG_QUEUE, console)
+        _log_listener.start()
+        log.addHandler(logging.handlers.QueueHandler(_LOG_QUEUE))
+        log.setLevel(logging.INFO)
+        log.propagate = False
+
+
+def _flush_logs():
+    """Escoa a fila de logs antes de imprimir o resumo do teste."""
+    if _log_listener is not None:
+        _log_listener.stop()
+        _log_listener.start()
+
+
+def _find_free_ports():
+    """Vincula dois sockets UDP em portas escolhidas pelo SO (remetente/receptor).
+
+    Os sockets são devolvidos já vinculados e repassados aos construtores rdt,
+    evitando a varredura de portas e a corrida entre o teste e o bind real.
+    """
+    sock_sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock_sender.bind(("localhost", 0))
+    sock_receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock_receiver.bind(("localhost", 0))
+    return sock_sender.getsockname()[1], sock_receiver.getsockname()[1], sock_sender, sock_receiver
+
+
+# Threads dos laços de recepção reaproveitadas entre os cenários do menu
+_EXECUTOR = ThreadPoolExecutor(max_workers=2, thread_name_prefix="rdt-test")
+atexit.register(_EXECUTOR.shutdown)
+
+# Pares remetente/receptor reaproveitados entre execuções do menu, por chave de
+# cenário; fechados somente ao sair do interpretador.
+_endpoint_cache = {}
+
+
+def _acquire_endpoints(key, sender_cls, receiver_cls, channel):
+    """Devolve (sender, receiver) do cenário, reaproveitando o par em cache."""
+    cached = _endpoint_cache.get(key)
+    if cached is not None:
+        sender, receiver = cached
+        sender.reset_stats()
+        receiver.reset_stats()
+        sender.channel = receiver.channel = channel
+        return sender, receiver
+
+    port_sender, port_receiver, sock_sender, sock_receiver = _find_free_ports()
+    sender = sender_cls(port=port_sender, dest_port=port_receiver, channel=channel, sock=sock_sender)
+    receiver = receiver_cls(port=port_receiver, channel=channel, sock=sock_receiver)
+    _endpoint_cache[key] = (sender, receiver)
+    return sender, receiver
+
+
+def _release_endpoints(key, reusable):
+    """Mantém o par em cache; se a execução não terminou sincronizada, descarta-o."""
+    if reusable:
+        return
+    sender, receiver = _endpoint_cache.pop(key)
+    sender.close()
+    receiver.close()
 
 
-def _find_free_ports(start_port=5000, step=2):
-    """Tenta encontrar duas portas UDP livres (remetente/receptor)."""
-    port_sender = start_port
-    port_receiver = start_port + 1
-
-    for _ in range(20):
-        try:
-            sock_a = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-            sock_a.bind(("localhost", port_sender))
-            sock_a.close()
-
-            sock_b = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-            sock_b.bind(("localhost", port_receiver))
-            sock_b.close()
-
-            return port_sender, port_receiver
-        except OSError:
-            port_sender += step
-            port_receiver += step
-
-    raise RuntimeError("Não foi possível encontrar par de portas livres.")
+@atexit.register
+def _close_endpoints():
+    for sender, receiver in _endpoint_cache.values():
+        sender.close()
+        receiver.close()
+    _endpoint_cache.clear()
 
 
 def _print_header(title):
@@ -63,66 +137,52 @@ def run_rdt20_perfect():
     _print_header("Teste rdt2.0 - Canal perfeito (10 mensagens, 0% corrupção)")
     _configure_logging(logging.INFO)
 
-    port_sender, port_receiver = _find_free_ports()
     channel = DirectChannel()
-    sender = RDT20Sender(port=port_sender, dest_port=port_receiver, channel=channel)
-    receiver = RDT20Receiver(port=port_receiver, channel=channel)
+    endpoint_key = ("rdt20", "perfect")
+    sender, receiver = _acquire_endpoints(endpoint_key, RDT20Sender, RDT20Receiver, channel)
 
-    messages = [f"Mensagem {i}" for i in range(10)]
+    messages = [f"Mensagem {i}".encode() for i in range(10)]
     received = []
+    shutdown = threading.Event()
 
     def receiver_loop():
-        attempts = 0
-        max_attempts = len(messages) * 5
-        while len(received) < len(messages) and attempts < max_attempts:
+        deadline = time.monotonic() + 5
+        announced = 0
+        while not shutdown.is_set() and time.monotonic() < deadline:
             idx = len(received) + 1
-            print(f"[RECEIVER] Aguardando mensagem {idx}/{len(messages)}...")
-            msg = receiver.receive(timeout=2)
-            attempts += 1
+            if idx != announced and idx <= len(messages):
+                log.info(f"[RECEIVER] Aguardando mensagem {idx}/{len(messages)}...")
+                announced = idx
+            msg = receiver.receive(timeout=min(1.0, max(deadline - time.monotonic(), 0.01)))
             if msg:
-                payload = msg.decode("utf-8")
-                received.append(payload)
-                print(f"[RECEIVER] Mensagem {len(received)}/{len(messages)} entregue: {payload}")
-            else:
-                print(f"[RECEIVER] Timeout aguardando mensagem {idx}/{len(messages)}")
-
-    recv_thread = threading.Thread(target=receiver_loop, daemon=True)
-    stop_monitor = threading.Event()
-
-    recv_thread.start()
-    
-    def monitor_retransmissions():
-        last_reported = -1
-        while not stop_monitor.is_set():
-            current = sender.get_retransmissions()
-            if current != last_reported:
-                print(f"[MONITOR] Retransmissões acumuladas: {current}")
-                last_reported = current
-            time.sleep(1.0)
-
-    monitor_thread = threading.Thread(target=monitor_retransmissions, daemon=True)
-    monitor_thread.start()
-
-    start_time = time.time()
+                received.append(msg)
+                log.info(f"[RECEIVER] Mensagem {len(received)}/{len(messages)} entregue: {msg.decode()}")
+        if len(received) < len(messages):
+            log.info(f"[RECEIVER] Timeout aguardando mensagem {len(received) + 1}/{len(messages)}")
+
+    recv_future = _EXECUTOR.submit(receiver_loop)
+
+    sender.on_retransmit = lambda total: log.info(f"[MONITOR] Retransmissões acumuladas: {total}")
+
+    start_ns = time.perf_counter_ns()
     for idx, msg in enumerate(messages):
-        print(f"[SENDER] Enviando mensagem {idx+1}/10: '{msg}'")
+        log.info(f"[SENDER] Enviando mensagem {idx+1}/10: '{msg.decode()}'")
         sender.send(msg)
-        time.sleep(0.1)
 
-    recv_thread.join(timeout=5)
-    elapsed = time.time() - start_time
-    stop_monitor.set()
-    monitor_thread.join(timeout=2)
+    # Remetentes rdt bloqueiam até o ACK: aqui a última mensagem já foi confirmada
+    elapsed_ns = time.perf_counter_ns() - start_ns
+    shutdown.set()
+    recv_future.result()
+    _flush_logs()
 
     print("\n--- Resumo Canal Perfeito ---")
     print(f"Mensagens esperadas/recebidas: {len(messages)}/{len(received)}")
     print(f"Retransmissões registradas: {sender.get_retransmissions()}")
-    print(f"Tempo total: {_format_time(elapsed)}")
+    print(f"Tempo total: {_format_time(elapsed_ns / 1e9)}")
     print("Resultado: Todas as mensagens chegaram corretamente." if len(received) == len(messages)
           else "Resultado: Nem todas as mensagens foram entregues.")
 
-    sender.close()
-    receiver.close()
+    _release_endpoints(endpoint_key, reusable=len(received) == len(messages))
 
 
 def run_rdt20_corruption():
@@ -130,28 +190,28 @@ def run_rdt20_corruption():
         "Teste rdt2.0 - Canal com 30% de corrupção (DATA corrompido, ACK íntegro)"
     )
     _configure_logging(logging.DEBUG)
-    logging.getLogger("utils.packet").setLevel(logging.INFO)
 
     class DataCorruptOnlyChannel(UnreliableChannel):
         """Canal que corrompe apenas pacotes DATA (ACK permanece íntegro)."""
 
+        __slots__ = ("max_corruptions_per_payload", "_payload_corruptions")
+
         def __init__(self, *args, max_corruptions_per_payload=1, **kwargs):
             super().__init__(*args, **kwargs)
             self.max_corruptions_per_payload = max_corruptions_per_payload
             self._payload_corruptions = {}
 
         def send(self, packet, dest_socket, dest_addr):
-            if random.random() < self.loss_rate:
+            if self._rand() < self.loss_rate:
                 print("[SIMULADOR] Pacote perdido pelo canal (rdt2.0)")
                 return
 
-            pkt_type, data, _ = RDT20Packet.parse_packet(packet)
             should_corrupt = False
 
-            if pkt_type == Packet.TYPE_DATA:
-                key = data
+            if packet[0] == _TYPE_DATA:
+                key = data = packet[_RDT20_HEADER_SIZE:]
                 count = self._payload_corruptions.get(key, 0)
-                if count < self.max_corruptions_per_payload and random.random() < self.corrupt_rate:
+                if count < self.max_corruptions_per_payload and self._rand() < self.corrupt_rate:
                     should_corrupt = True
                     self._payload_corruptions[key] = count + 1
                 else:
@@ -161,44 +221,44 @@ def run_rdt20_corruption():
                 packet = self._corrupt_packet(packet)
                 print(f"[SIMULADOR] Pacote DATA corrompido (tentativa {self._payload_corruptions[data]})")
 
-            delay = random.uniform(*self.delay_range)
-            threading.Timer(delay, lambda: dest_socket.sendto(packet, dest_addr)).start()
+            delay = self._delay_lo + self._delay_span * self._rand()
+            self._schedule(delay, packet, dest_socket, dest_addr)
 
-    port_sender, port_receiver = _find_free_ports(5200)
     channel = DataCorruptOnlyChannel(loss_rate=0.0, corrupt_rate=0.3, delay_range=(0.01, 0.2))
-    sender = RDT20Sender(port=port_sender, dest_port=port_receiver, channel=channel)
-    receiver = RDT20Receiver(port=port_receiver, channel=channel)
+    endpoint_key = ("rdt20", "corruption")
+    sender, receiver = _acquire_endpoints(endpoint_key, RDT20Sender, RDT20Receiver, channel)
 
-    messages = [f"Msg {i}" for i in range(10)]
+    messages = [f"Msg {i}".encode() for i in range(10)]
     received = []
+    shutdown = threading.Event()
 
     def receiver_loop():
-        attempts = 0
-        max_attempts = len(messages) * 10
-        while len(received) < len(messages) and attempts < max_attempts:
+        deadline = time.monotonic() + 40
+        announced = 0
+        while not shutdown.is_set() and time.monotonic() < deadline:
             idx = len(received) + 1
-            print(f"\n[RECEIVER] Aguardando mensagem {idx}/{len(messages)}...")
-            msg = receiver.receive(timeout=10)
-            attempts += 1
+            if idx != announced and idx <= len(messages):
+                log.info(f"\n[RECEIVER] Aguardando mensagem {idx}/{len(messages)}...")
+                announced = idx
+            msg = receiver.receive(timeout=min(1.0, max(deadline - time.monotonic(), 0.01)))
             if msg:
-                payload = msg.decode("utf-8")
-                received.append(payload)
-                print(f"[RECEIVER] Mensagem {len(received)}/{len(messages)} entregue: '{payload}'")
-            else:
-                print(f"[RECEIVER] Timeout aguardando mensagem {idx}/{len(messages)} (pode indicar corrupção persistente)")
+                received.append(msg)
+                log.info(f"[RECEIVER] Mensagem {len(received)}/{len(messages)} entregue: '{msg.decode()}'")
+        if len(received) < len(messages):
+            log.info(f"[RECEIVER] Timeout aguardando mensagem {len(received) + 1}/{len(messages)} (pode indicar corrupção persistente)")
 
-    recv_thread = threading.Thread(target=receiver_loop, daemon=True)
-    recv_thread.start()
+    recv_future = _EXECUTOR.submit(receiver_loop)
 
-    start_time = time.time()
+    start_ns = time.perf_counter_ns()
     for idx, msg in enumerate(messages):
-        print(f"\n[SENDER] Tentando entregar mensagem {idx+1}/10: '{msg}'")
+        log.info(f"\n[SENDER] Tentando entregar mensagem {idx+1}/10: '{msg.decode()}'")
         sender.send(msg)
-        print(f"[SENDER] Retransmissões acumuladas até agora: {sender.get_retransmissions()}")
-        time.sleep(0.2)
+        log.info(f"[SENDER] Retransmissões acumuladas até agora: {sender.get_retransmissions()}")
 
-    recv_thread.join(timeout=40)
-    elapsed = time.time() - start_time
+    elapsed_ns = time.perf_counter_ns() - start_ns
+    shutdown.set()
+    recv_future.result()
+    _flush_logs()
 
     stats = receiver.get_stats()
 
@@ -206,19 +266,18 @@ def run_rdt20_corruption():
     print(f"Mensagens esperadas/recebidas: {len(messages)}/{len(received)}")
     print(f"Retransmissões acumuladas (rdt2.0): {sender.get_retransmissions()}")
     print(f"Pacotes corrompidos detectados pelo receptor: {stats['corrupted']}")
-    print(f"Tempo total: {_format_time(elapsed)}")
+    print(f"Tempo total: {_format_time(elapsed_ns / 1e9)}")
     if len(received) == len(messages):
         print("Resultado: Todas as mensagens chegaram, apesar das corrupções.")
     else:
         print("Resultado: Nem todas as mensagens foram entregues (rdt2.0 pode ficar preso sem timer).")
 
-    sender.close()
-    receiver.close()
+    _release_endpoints(endpoint_key, reusable=len(received) == len(messages))
 
 
-def _rdt21_overhead_report(messages, received, sender, receiver, elapsed):
+def _rdt21_overhead_report(messages, received, sender, receiver, elapsed_ns):
     stats_rx = receiver.get_stats()
-    payload_bytes = sum(len(m.encode("utf-8")) for m in received)
+    payload_bytes = sum(map(len, received))
     data_packets = len(messages) + sender.get_retransmissions()
     data_bytes = data_packets * (len(messages[0]) + 6)  # tipo + seq + checksum
     ack_packets = stats_rx["received"] + stats_rx["duplicates"]
@@ -233,7 +292,7 @@ def _rdt21_overhead_report(messages, received, sender, receiver, elapsed):
     print(f"Payload entregue: {payload_bytes} bytes")
     print(f"Overhead total (dados + ACKs - payload): {overhead_total} bytes")
     print(f"Overhead médio por mensagem: {overhead_avg:.2f} bytes/mensagem")
-    print(f"Tempo total: {_format_time(elapsed)}")
+    print(f"Tempo total: {_format_time(elapsed_ns / 1e9)}")
 
     if len(set(received)) == len(received) == len(messages):
         print("Resultado: Sem duplicação de dados na camada receptora.")
@@ -241,135 +300,100 @@ def _rdt21_overhead_report(messages, received, sender, receiver, elapsed):
         print("Resultado: Duplicação detectada! Verificar implementação.")
 
 
-def run_rdt21_data_corruption():
-    _print_header("Teste rdt2.1 - 20% de corrupção somente em DATA")
-    _configure_logging(logging.INFO)
-    logging.getLogger("utils.packet").setLevel(logging.INFO)
+def _run_message_exchange(sender, receiver, messages, budget):
+    """Envia as mensagens e coleta as entregas em paralelo (cenários rdt2.1/3.0).
 
-    class RDT21DataCorruptChannel(UnreliableChannel):
-        def send(self, packet, dest_socket, dest_addr):
-            packet_type, _, _, _ = RDT21Packet.parse_packet(packet)
-
-            if random.random() < self.loss_rate:
-                print("[SIMULADOR] Pacote perdido (rdt2.1 DATA)")
-                return
-
-            if packet_type == Packet.TYPE_DATA and random.random() < self.corrupt_rate:
-                packet = self._corrupt_packet(packet)
-                print("[SIMULADOR] Pacote DATA corrompido (rdt2.1)")
-
-            delay = random.uniform(*self.delay_range)
-            threading.Timer(delay, lambda: dest_socket.sendto(packet, dest_addr)).start()
-
-    port_sender, port_receiver = _find_free_ports(5400)
-    channel = RDT21DataCorruptChannel(
-        loss_rate=0.0, corrupt_rate=0.2, delay_range=(0.01, 0.15)
-    )
-    sender = RDT21Sender(port=port_sender, dest_port=port_receiver, channel=channel)
-    receiver = RDT21Receiver(port=port_receiver, channel=channel)
-
-    messages = [f"Msg {i}" for i in range(10)]
+    Returns:
+        tupla (received, elapsed_ns) com as mensagens entregues e o tempo total em ns
+    """
     received = []
+    shutdown = threading.Event()
 
     def receiver_loop():
-        attempts = 0
-        max_attempts = len(messages) * 10
-        while len(received) < len(messages) and attempts < max_attempts:
-            idx = len(received) + 1
-            msg = receiver.receive(timeout=5)
-            attempts += 1
+        # Continua recebendo até o remetente terminar (e não só até a última
+        # entrega): se o último ACK se perder, a retransmissão ainda é confirmada.
+        deadline = time.monotonic() + budget
+        while not shutdown.is_set() and time.monotonic() < deadline:
+            msg = receiver.receive(timeout=min(1.0, max(deadline - time.monotonic(), 0.01)))
             if msg:
-                payload = msg.decode("utf-8")
-                received.append(payload)
-                print(f"[RECEIVER] Mensagem {len(received)}/{len(messages)} entregue: '{payload}'")
-            else:
-                print(f"[RECEIVER] Timeout aguardando mensagem {idx}/{len(messages)}")
+                received.append(msg)
+                log.info(f"[RECEIVER] Mensagem {len(received)}/{len(messages)} entregue: '{msg.decode()}'")
+        if len(received) < len(messages):
+            log.info(f"[RECEIVER] Timeout aguardando mensagem {len(received) + 1}/{len(messages)}")
 
-    recv_thread = threading.Thread(target=receiver_loop, daemon=True)
-    recv_thread.start()
+    recv_future = _EXECUTOR.submit(receiver_loop)
 
-    start_time = time.time()
+    start_ns = time.perf_counter_ns()
     for idx, msg in enumerate(messages):
-        print(f"[SENDER] Enviando mensagem {idx+1}/10: '{msg}'")
+        log.info(f"[SENDER] Enviando mensagem {idx+1}/{len(messages)}: '{msg.decode()}'")
         sender.send(msg)
-        time.sleep(0.1)
 
-    recv_thread.join(timeout=20)
-    elapsed = time.time() - start_time
+    elapsed_ns = time.perf_counter_ns() - start_ns
+    shutdown.set()
+    recv_future.result()
+    _flush_logs()
+    return received, elapsed_ns
 
-    print("\n--- Resumo rdt2.1 (corrupção em DATA) ---")
-    _rdt21_overhead_report(messages, received, sender, receiver, elapsed)
 
-    sender.close()
-    receiver.close()
+class RDT21TypeCorruptChannel(UnreliableChannel):
+    """Canal rdt2.1 que corrompe apenas pacotes de um tipo (DATA ou ACK)."""
 
+    __slots__ = ("target_type", "_label")
 
-def run_rdt21_ack_corruption():
-    _print_header("Teste rdt2.1 - 20% de corrupção somente em ACK")
-    _configure_logging(logging.INFO)
-    logging.getLogger("utils.packet").setLevel(logging.INFO)
+    def __init__(self, target_type, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.target_type = target_type
+        self._label = "DATA" if target_type == _TYPE_DATA else "ACK"
 
-    class RDT21AckCorruptChannel(UnreliableChannel):
-        def send(self, packet, dest_socket, dest_addr):
-            packet_type, _, _, _ = RDT21Packet.parse_packet(packet)
+    def send(self, packet, dest_socket, dest_addr):
+        if self._rand() < self.loss_rate:
+            print(f"[SIMULADOR] Pacote perdido (rdt2.1 {self._label})")
+            return
 
-            if random.random() < self.loss_rate:
-                print("[SIMULADOR] Pacote perdido (rdt2.1 ACK)")
-                return
+        if packet[0] == self.target_type and self._rand() < self.corrupt_rate:
+            packet = self._corrupt_packet(packet)
+            print(f"[SIMULADOR] Pacote {self._label} corrompido (rdt2.1)")
 
-            if packet_type == Packet.TYPE_ACK and random.random() < self.corrupt_rate:
-                packet = self._corrupt_packet(packet)
-                print("[SIMULADOR] Pacote ACK corrompido (rdt2.1)")
+        delay = self._delay_lo + self._delay_span * self._rand()
+        self._schedule(delay, packet, dest_socket, dest_addr)
 
-            delay = random.uniform(*self.delay_range)
-            threading.Timer(delay, lambda: dest_socket.sendto(packet, dest_addr)).start()
 
-    port_sender, port_receiver = _find_free_ports(5600)
-    channel = RDT21AckCorruptChannel(
-        loss_rate=0.0, corrupt_rate=0.2, delay_range=(0.01, 0.15)
-    )
-    sender = RDT21Sender(port=port_sender, dest_port=port_receiver, channel=channel)
-    receiver = RDT21Receiver(port=port_receiver, channel=channel)
+# Cenários rdt2.1: chave -> (título, tipo de pacote corrompido)
+RDT21_SCENARIOS = {
+    "data": ("Teste rdt2.1 - 20% de corrupção somente em DATA", _TYPE_DATA),
+    "ack": ("Teste rdt2.1 - 20% de corrupção somente em ACK", _TYPE_ACK),
+}
 
-    messages = [f"Msg {i}" for i in range(10)]
-    received = []
 
-    def receiver_loop():
-        attempts = 0
-        max_attempts = len(messages) * 10
-        while len(received) < len(messages) and attempts < max_attempts:
-            idx = len(received) + 1
-            msg = receiver.receive(timeout=5)
-            attempts += 1
-            if msg:
-                payload = msg.decode("utf-8")
-                received.append(payload)
-                print(f"[RECEIVER] Mensagem {len(received)}/{len(messages)} entregue: '{payload}'")
-            else:
-                print(f"[RECEIVER] Timeout aguardando mensagem {idx}/{len(messages)}")
+def run_rdt21(kind):
+    title, target_type = RDT21_SCENARIOS[kind]
+    _print_header(title)
+    _configure_logging(logging.INFO)
 
-    recv_thread = threading.Thread(target=receiver_loop, daemon=True)
-    recv_thread.start()
+    channel = RDT21TypeCorruptChannel(
+        target_type, loss_rate=0.0, corrupt_rate=0.2, delay_range=(0.01, 0.15)
+    )
+    endpoint_key = ("rdt21", kind)
+    sender, receiver = _acquire_endpoints(endpoint_key, RDT21Sender, RDT21Receiver, channel)
 
-    start_time = time.time()
-    for idx, msg in enumerate(messages):
-        print(f"[SENDER] Enviando mensagem {idx+1}/10: '{msg}'")
-        sender.send(msg)
-        time.sleep(0.1)
+    messages = [f"Msg {i}".encode() for i in range(10)]
+    received, elapsed_ns = _run_message_exchange(sender, receiver, messages, budget=20)
 
-    recv_thread.join(timeout=20)
-    elapsed = time.time() - start_time
+    label = "DATA" if target_type == _TYPE_DATA else "ACK"
+    print(f"\n--- Resumo rdt2.1 (corrupção em {label}) ---")
+    _rdt21_overhead_report(messages, received, sender, receiver, elapsed_ns)
 
-    print("\n--- Resumo rdt2.1 (corrupção em ACK) ---")
-    _rdt21_overhead_report(messages, received, sender, receiver, elapsed)
-
-    sender.close()
-    receiver.close()
+    _release_endpoints(endpoint_key, reusable=len(received) == len(messages))
 
 
 class RDT30SelectiveLossChannel(UnreliableChannel):
     """Canal que permite configurar perdas e corrupções com limites para DATA e ACK."""
 
+    __slots__ = (
+        "data_loss", "ack_loss", "max_corruptions_per_data", "max_corruptions_per_ack",
+        "_data_ct", "_ack_ct", "_loss_by_type", "_corruption_by_type",
+    )
+
     def __init__(
         self,
         data_loss=0.0,
@@ -378,91 +402,85 @@ class RDT30SelectiveLossChannel(UnreliableChannel):
         delay_range=(0.01, 0.1),
         max_corruptions_per_data=1,
         max_corruptions_per_ack=1,
+        seed=None,
     ):
-        super().__init__(loss_rate=0.0, corrupt_rate=corrupt_rate, delay_range=delay_range)
+        super().__init__(loss_rate=0.0, corrupt_rate=corrupt_rate, delay_range=delay_range, seed=seed)
         self.data_loss = data_loss
         self.ack_loss = ack_loss
         self.max_corruptions_per_data = max_corruptions_per_data
         self.max_corruptions_per_ack = max_corruptions_per_ack
-        self._corruption_tracker = defaultdict(int)
+        # Contadores de corrupção indexados pelo seq_num (0/1). O de DATA do outro
+        # seq é zerado a cada DATA enviado, então o limite vale por mensagem.
+        self._data_ct = {0: 0, 1: 0}
+        self._ack_ct = {0: 0, 1: 0}
+        # Parâmetros por tipo de pacote, resolvidos uma vez (evita cadeias de if por pacote)
+        self._loss_by_type = {_TYPE_DATA: data_loss, _TYPE_ACK: ack_loss}
+        self._corruption_by_type = {
+            _TYPE_DATA: (self._data_ct, max_corruptions_per_data),
+            _TYPE_ACK: (self._ack_ct, max_corruptions_per_ack),
+        }
 
     def send(self, packet, dest_socket, dest_addr):
-        packet_type, seq_num, data, _ = RDT21Packet.parse_packet(packet)
-        loss_rate = self.data_loss if packet_type == Packet.TYPE_DATA else self.ack_loss if packet_type == Packet.TYPE_ACK else 0.0
+        packet_type = packet[0]
+        seq_num = packet[1]
+        if packet_type == _TYPE_DATA:
+            self._data_ct[seq_num ^ 1] = 0
 
-        if random.random() < loss_rate:
-            tipo = "DATA" if packet_type == Packet.TYPE_DATA else "ACK"
+        if self._rand() < self._loss_by_type.get(packet_type, 0.0):
+            tipo = "DATA" if packet_type == _TYPE_DATA else "ACK"
             print(f"[SIMULADOR] Pacote {tipo} perdido (rdt3.0)")
             return
 
         should_corrupt = False
-        if random.random() < self.corrupt_rate:
-            if packet_type == Packet.TYPE_DATA:
-                key = (packet_type, seq_num, data)
-                limit = self.max_corruptions_per_data
-            elif packet_type == Packet.TYPE_ACK:
-                key = (packet_type, seq_num)
-                limit = self.max_corruptions_per_ack
-            else:
-                key = (packet_type, seq_num)
-                limit = None
-
-            if limit is None or self._corruption_tracker[key] < limit:
+        if self._rand() < self.corrupt_rate:
+            ct, limit = self._corruption_by_type.get(packet_type, (self._ack_ct, self.max_corruptions_per_ack))
+
+            if ct[seq_num] < limit:
                 should_corrupt = True
-                self._corruption_tracker[key] += 1
+                ct[seq_num] += 1
 
         if should_corrupt:
             packet = self._corrupt_packet(packet)
-            tipo = "DATA" if packet_type == Packet.TYPE_DATA else "ACK"
-            print(f"[SIMULADOR] Pacote {tipo} corrompido (rdt3.0) - tentativa {self._corruption_tracker[key]}")
-
-        delay = random.uniform(*self.delay_range)
-        threading.Timer(delay, lambda: dest_socket.sendto(packet, dest_addr)).start()
-
-
-def _execute_rdt30_test(title, channel_factory, start_port):
+            tipo = "DATA" if packet_type == _TYPE_DATA else "ACK"
+            print(f"[SIMULADOR] Pacote {tipo} corrompido (rdt3.0) - tentativa {ct[seq_num]}")
+
+        delay = self._delay_lo + self._delay_span * self._rand()
+        self._schedule(delay, packet, dest_socket, dest_addr)
+
+
+# Cenários rdt3.0: chave -> (título, parâmetros do RDT30SelectiveLossChannel)
+RDT30_SCENARIOS = {
+    "data_loss": (
+        "Teste rdt3.0 - Perda de 15% apenas em DATA",
+        dict(data_loss=0.15, ack_loss=0.0, corrupt_rate=0.0, delay_range=(0.01, 0.15)),
+    ),
+    "ack_loss": (
+        "Teste rdt3.0 - Perda de 15% apenas em ACK",
+        dict(data_loss=0.0, ack_loss=0.15, corrupt_rate=0.0, delay_range=(0.01, 0.15)),
+    ),
+    "variable_delay": (
+        "Teste rdt3.0 - Atraso variável (50-500ms) sem perdas",
+        dict(data_loss=0.0, ack_loss=0.0, corrupt_rate=0.0, delay_range=(0.05, 0.5)),
+    ),
+}
+
+
+def run_rdt30(kind):
+    title, channel_config = RDT30_SCENARIOS[kind]
     _print_header(title)
     _configure_logging(logging.INFO)
-    logging.getLogger("utils.packet").setLevel(logging.INFO)
-
-    port_sender, port_receiver = _find_free_ports(start_port)
-    channel = channel_factory()
-    sender = RDT30Sender(port=port_sender, dest_port=port_receiver, channel=channel)
-    receiver = RDT30Receiver(port=port_receiver, channel=channel)
-
-    messages = [f"Msg {i}" for i in range(10)]
-    received = []
-
-    def receiver_loop():
-        attempts = 0
-        max_attempts = len(messages) * 12
-        while len(received) < len(messages) and attempts < max_attempts:
-            idx = len(received) + 1
-            msg = receiver.receive(timeout=10)
-            attempts += 1
-            if msg:
-                payload = msg.decode("utf-8")
-                received.append(payload)
-                print(f"[RECEIVER] Mensagem {len(received)}/{len(messages)} entregue: '{payload}'")
-            else:
-                print(f"[RECEIVER] Timeout aguardando mensagem {idx}/{len(messages)}")
 
-    recv_thread = threading.Thread(target=receiver_loop, daemon=True)
-    recv_thread.start()
+    channel = RDT30SelectiveLossChannel(**channel_config)
+    endpoint_key = ("rdt30", kind)
+    sender, receiver = _acquire_endpoints(endpoint_key, RDT30Sender, RDT30Receiver, channel)
 
-    start_time = time.time()
-    for idx, msg in enumerate(messages):
-        print(f"[SENDER] Enviando mensagem {idx+1}/10: '{msg}'")
-        sender.send(msg)
-        time.sleep(0.15)
-
-    recv_thread.join(timeout=60)
-    elapsed = time.time() - start_time
+    messages = [f"Msg {i}".encode() for i in range(10)]
+    received, elapsed_ns = _run_message_exchange(sender, receiver, messages, budget=60)
 
     stats_tx = sender.get_stats()
     stats_rx = receiver.get_stats()
-    payload_bytes = sum(len(m.encode("utf-8")) for m in received)
-    throughput = (payload_bytes * 8) / elapsed if elapsed > 0 else 0
+    payload_bytes = sum(map(len, received))
+    throughput = payload_bytes * 8 * 1_000_000_000 // elapsed_ns if elapsed_ns > 0 else 0  # bps
 
     total_transmissoes = len(messages) + stats_tx['retransmissions']
     retransmission_rate = (stats_tx['retransmissions'] / total_transmissoes) if total_transmissoes > 0 else 0.0
@@ -472,7 +490,7 @@ def _execute_rdt30_test(title, channel_factory, start_port):
     print(f"Retransmissões (sender): {stats_tx['retransmissions']}")
     print(f"Taxa de retransmissão: {retransmission_rate*100:.2f}% ({stats_tx['retransmissions']}/{total_transmissoes} transmissões totais)")
     print(f"Pacotes corrompidos detectados no receptor: {stats_rx['corrupted']}")
-    print(f"Tempo total: {_format_time(elapsed)}")
+    print(f"Tempo total: {_format_time(elapsed_ns / 1e9)}")
     print(f"Throughput efetivo (payload): {throughput/1_000_000:.4f} Mbps")
     print(f"Throughput total enviado (stats sender): {stats_tx['throughput_mbps']:.4f} Mbps")
 
@@ -481,44 +499,7 @@ def _execute_rdt30_test(title, channel_factory, start_port):
     else:
         print("Resultado: Perdas impediram a entrega completa.")
 
-    sender.close()
-    receiver.close()
-
-
-def run_rdt30_data_loss():
-    def channel_factory():
-        return RDT30SelectiveLossChannel(
-            data_loss=0.15,
-            ack_loss=0.0,
-            corrupt_rate=0.0,
-            delay_range=(0.01, 0.15),
-        )
-
-    _execute_rdt30_test("Teste rdt3.0 - Perda de 15% apenas em DATA", channel_factory, start_port=6200)
-
-
-def run_rdt30_ack_loss():
-    def channel_factory():
-        return RDT30SelectiveLossChannel(
-            data_loss=0.0,
-            ack_loss=0.15,
-            corrupt_rate=0.0,
-            delay_range=(0.01, 0.15),
-        )
-
-    _execute_rdt30_test("Teste rdt3.0 - Perda de 15% apenas em ACK", channel_factory, start_port=6400)
-
-
-def run_rdt30_variable_delay():
-    def channel_factory():
-        return RDT30SelectiveLossChannel(
-            data_loss=0.0,
-            ack_loss=0.0,
-            corrupt_rate=0.0,
-            delay_range=(0.05, 0.5),
-        )
-
-    _execute_rdt30_test("Teste rdt3.0 - Atraso variável (50-500ms) sem perdas", channel_factory, start_port=6600)
+    _release_endpoints(endpoint_key, reusable=len(received) == len(messages))
 
 
 def menu_rdt20():
@@ -547,12 +528,11 @@ def menu_rdt21():
         print("0 - Voltar")
         choice = input("Escolha uma opção: ").strip()
 
-        if choice == "1":
-            run_rdt21_data_corruption()
-        elif choice == "2":
-            run_rdt21_ack_corruption()
-        elif choice == "0":
+        if choice == "0":
             break
+        kind = {"1": "data", "2": "ack"}.get(choice)
+        if kind:
+            run_rdt21(kind)
         else:
             print("Opção inválida. Tente novamente.")
 
@@ -566,14 +546,11 @@ def menu_rdt30():
         print("0 - Voltar")
         choice = input("Escolha uma opção: ").strip()
 
-        if choice == "1":
-            run_rdt30_data_loss()
-        elif choice == "2":
-            run_rdt30_ack_loss()
-        elif choice == "3":
-            run_rdt30_variable_delay()
-        elif choice == "0":
+        if choice == "0":
             break
+        kind = {"1": "data_loss", "2": "ack_loss", "3": "variable_delay"}.get(choice)
+        if kind:
+            run_rdt30(kind)
         else:
             print("Opção inválida. Tente novamente.")
 
@@ -3,20 +3,57 @@ Testes interativos para Fase 2 - Go-Back-N (GBN).
 """
 import sys
 import os
+import atexit
 import time
-import math
+import array
+import collections
+import contextlib
+import csv
+import json
+import statistics
 import socket
 import logging
+import selectors
 import threading
-
-import matplotlib.pyplot as plt
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from fase1.rdt30 import RDT30Sender, RDT30Receiver
 from fase2.gbn import GBNSender, GBNReceiver
-from utils.simulator import UnreliableChannel, DirectChannel, GBNBoundedLossChannel
-
+from utils.simulator import DirectChannel, GBNBoundedLossChannel, make_drop_mask
+
+# Payloads fixos, criados uma única vez e reaproveitados em todos os envios
+_PAYLOAD_1MB = b'x' * (1024 * 1024)  # fatiado via memoryview nos testes de 1 MB
+_LOSS_PAYLOAD = b'Pacote_GBN' * 64  # ~640 bytes
+_WINDOW_PAYLOAD = b'GBN_WINDOW' * 64  # ~640 bytes
+# Espera máxima pela janela antes de voltar a consultar o socket do receptor
+_WINDOW_WAIT_SLICE = 0.01
+# Resultados das transferências de 1 MB já executadas nesta sessão, por (função, args)
+_RESULT_CACHE = {}
+# Processos da varredura de janelas, criados na primeira análise e reaproveitados
+_WINDOW_POOL = None
+# Par GBN do processo (um por processo da varredura), reaproveitado entre
+# execuções com a janela trocada em reset_state; fechado ao sair do interpretador.
+# O pool não manda o mesmo N sempre ao mesmo processo, então o par não é por N.
+_gbn_endpoints = None
+# Pares (porta_sender, porta_receiver) livres, reservados em lote e reaproveitados
+_PORT_POOL = collections.deque()
+
+
+# Loggers dos protocolos, resolvidos uma única vez
+_PROTO_LOGGERS = tuple(
+    logging.getLogger(name)
+    for name in (
+        "RDT30Sender",
+        "RDT30Receiver",
+        "GBNSender",
+        "GBNReceiver",
+        "utils.packet",
+        "utils.simulator",
+    )
+)
+_LOGGING_STATE = {"protocol_level": None}
 
 
 def _configure_logging(level=logging.INFO):
@@ -29,21 +66,65 @@ def _configure_logging(level=logging.INFO):
 def _set_protocol_logging(level):
     """
     Ajusta o nível de log dos principais componentes para evitar spam em testes longos.
+    Não faz nada se o nível pedido já estiver aplicado.
     """
-    for logger_name in (
-        "RDT30Sender",
-        "RDT30Receiver",
-        "GBNSender",
-        "GBNReceiver",
-        "utils.packet",
-        "utils.simulator",
-    ):
-        logger = logging.getLogger(logger_name)
+    if _LOGGING_STATE["protocol_level"] == level:
+        return
+    _LOGGING_STATE["protocol_level"] = level
+    for logger in _PROTO_LOGGERS:
         logger.setLevel(level)
+        # setup_logger fixa o nível do handler na criação; precisa acompanhar o logger
         for handler in logger.handlers:
             handler.setLevel(level)
 
 
+@contextlib.contextmanager
+def _logging_disabled(level=logging.INFO):
+    """Suprime globalmente logs até `level` durante um trecho cronometrado."""
+    logging.disable(level)
+    try:
+        yield
+    finally:
+        logging.disable(logging.NOTSET)
+
+
+_configure_logging(logging.INFO)
+
+
+def _core_pair():
+    """
+    Dois cores distintos da afinidade atual, para separar sender e receptor
+    nos testes em loopback; (None, None) se a plataforma não suportar ou só
+    houver um core disponível.
+    """
+    if not hasattr(os, "sched_getaffinity"):
+        return None, None
+    cores = sorted(os.sched_getaffinity(0))
+    if len(cores) < 2:
+        return None, None
+    return cores[0], cores[1]
+
+
+def _pin(thread_id, core):
+    """Fixa a thread (native_id; 0 = thread atual) em `core`, se houver core definido."""
+    if core is not None:
+        os.sched_setaffinity(thread_id, {core})
+
+
+@contextlib.contextmanager
+def _pinned(core):
+    """Fixa a thread atual em `core` durante o bloco e restaura a afinidade anterior."""
+    if core is None:
+        yield
+        return
+    previous = os.sched_getaffinity(0)
+    _pin(0, core)
+    try:
+        yield
+    finally:
+        os.sched_setaffinity(0, previous)
+
+
 def _print_header(title):
     print("\n" + "=" * 70)
     print(title)
@@ -64,6 +145,157 @@ def _find_free_ports(start_port=6500):
     raise RuntimeError("Não foi possível encontrar portas UDP livres.")
 
 
+def _seed_port_pool(n=16, start_port=6500):
+    """Sonda de uma vez n pares de portas livres e os coloca no pool."""
+    port = start_port
+    for _ in range(n):
+        pair = _find_free_ports(port)
+        _PORT_POOL.append(pair)
+        port = pair[1] + 1
+
+
+def _acquire_ports():
+    """Retira um par de portas do pool (sondando o lote na primeira vez)."""
+    if not _PORT_POOL:
+        _seed_port_pool()
+    return _PORT_POOL.popleft()
+
+
+def _acquire_gbn_endpoints(window_size):
+    """Devolve (sender, receiver) GBN com a janela pedida, reaproveitando o par do processo."""
+    global _gbn_endpoints
+    if _gbn_endpoints is not None:
+        sender, receiver = _gbn_endpoints
+        # Seguro: o par só fica em cache com canal sem atraso e tudo confirmado
+        sender.reset_state(window_size)
+        receiver.reset_state()
+        return sender, receiver
+
+    channel = DirectChannel()
+    # Porta 0: o kernel escolhe portas livres, sem sondar o pool
+    receiver = GBNReceiver(port=0, channel=channel)
+    sender = GBNSender(
+        port=0,
+        dest_port=receiver.port,
+        channel=channel,
+        window_size=window_size,
+        timeout=1.0,
+    )
+    _gbn_endpoints = (sender, receiver)
+    return sender, receiver
+
+
+def _release_gbn_endpoints(reusable):
+    """
+    Mantém o par em cache; descarta-o se a transferência não terminou confirmada
+    ou se o canal ainda pode entregar pacotes atrasados na próxima execução.
+    """
+    if not reusable:
+        _close_gbn_endpoints()
+
+
+@atexit.register
+def _close_gbn_endpoints():
+    global _gbn_endpoints
+    if _gbn_endpoints is not None:
+        sender, receiver = _gbn_endpoints
+        _gbn_endpoints = None
+        sender.close()
+        receiver.close()
+
+
+def _available_cores():
+    """Número de cores que este processo pode usar."""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def _window_pool():
+    """
+    ProcessPoolExecutor da varredura, criado sob demanda e mantido entre execuções.
+    Limitado aos cores disponíveis: processos além disso disputariam CPU e
+    distorceriam o throughput medido.
+    """
+    global _WINDOW_POOL
+    if _WINDOW_POOL is None:
+        _WINDOW_POOL = ProcessPoolExecutor(max_workers=min(4, _available_cores()))
+        atexit.register(_WINDOW_POOL.shutdown)
+    return _WINDOW_POOL
+
+
+def _tune_socket_buffers(sender, receiver, window_size, chunk_size):
+    """
+    Dimensiona SO_SNDBUF do sender e SO_RCVBUF do receptor para comportar a
+    janela inteira em trânsito (com folga), e registra o tamanho concedido
+    pelo kernel (no Linux o valor lido é o dobro do pedido, limitado por
+    net.core.wmem_max/rmem_max).
+    """
+    buf_size = max(256 * 1024, window_size * chunk_size * 4)
+    sender.socket.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, buf_size)
+    receiver.socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, buf_size)
+    logging.info(
+        "Buffers UDP: pedido=%d B | SO_SNDBUF=%d B | SO_RCVBUF=%d B",
+        buf_size,
+        sender.socket.getsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF),
+        receiver.socket.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF),
+    )
+
+
+def _release_ports(ports):
+    """Devolve ao pool um par de portas cujos sockets já foram fechados."""
+    _PORT_POOL.append(ports)
+
+
+def _receiver_selector(receiver):
+    """Cria um selector com o socket do receptor registrado para leitura."""
+    selector = selectors.DefaultSelector()
+    selector.register(receiver.socket, selectors.EVENT_READ)
+    return selector
+
+
+def _drain_receiver(receiver, selector, sender, done, deadline):
+    """
+    Processa o receptor no próprio thread do teste até done() ser verdadeiro
+    ou o deadline (time.monotonic) passar. receive() só é chamado quando o
+    selector indica datagrama pronto; sem dados, espera o avanço da janela
+    do sender (sinalizado pela thread de ACKs) por no máximo _WINDOW_WAIT_SLICE.
+
+    Returns:
+        True se done() foi satisfeito, False se o deadline expirou
+    """
+    while not done():
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False
+        if selector.select(timeout=0):
+            receiver.receive()
+        else:
+            sender.wait_window(done, min(remaining, _WINDOW_WAIT_SLICE))
+    return True
+
+
+def _cached(fn, *args):
+    """Executa fn(*args) só na primeira vez; depois devolve o resultado guardado."""
+    key = (fn.__name__, args)
+    result = _RESULT_CACHE.get(key)
+    if result is None:
+        result = _RESULT_CACHE[key] = fn(*args)
+    return result
+
+
+def _send_interval_percentiles(timestamps, count):
+    """
+    Calcula mediana e p99 (em µs) dos intervalos entre envios consecutivos,
+    a partir dos `count` primeiros instantes (perf_counter_ns) registrados.
+    """
+    if count < 3:
+        return 0.0, 0.0
+    deltas = [b - a for a, b in zip(timestamps[:count - 1], timestamps[1:count])]
+    cuts = statistics.quantiles(deltas, n=100, method="inclusive")
+    return cuts[49] / 1000, cuts[98] / 1000
+
+
 def _calc_utilization(payload_bytes, chunk_bytes, retransmissions):
     """Calcula utilização do canal considerando retransmissões."""
     total_sent = payload_bytes + retransmissions * chunk_bytes
@@ -78,9 +310,26 @@ def _calc_retransmission_rate(total_packets, retransmissions):
     return retransmissions / total_packets
 
 
+def _export_window_results(resultados_ordenados, base_path):
+    """Salva os resultados da análise em <base_path>.csv e <base_path>.json."""
+    csv_path = base_path + ".csv"
+    with open(csv_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=list(resultados_ordenados[0].keys()))
+        writer.writeheader()
+        writer.writerows(resultados_ordenados)
+
+    json_path = base_path + ".json"
+    with open(json_path, "w", encoding="utf-8") as f:
+        json.dump(resultados_ordenados, f, ensure_ascii=False, indent=2)
+
+    print(f"Dados salvos em: {csv_path} e {json_path}")
+
+
 def _plot_window_throughput(resultados, filename="gbn_throughput.png"):
     """
     Gera gráfico Throughput x Tamanho da Janela e salva como PNG.
+    Os dados usados também são salvos em CSV/JSON ao lado do PNG, para
+    refazer o gráfico sem repetir as medições.
     """
     if not resultados:
         logging.warning("Sem dados para plotar throughput x janela.")
@@ -93,9 +342,15 @@ def _plot_window_throughput(resultados, filename="gbn_throughput.png"):
     output_dir = os.path.join(os.path.dirname(__file__), "plots")
     os.makedirs(output_dir, exist_ok=True)
     output_path = os.path.join(output_dir, filename)
+    _export_window_results(resultados_ordenados, os.path.splitext(output_path)[0])
+
+    # Import tardio: só quem gera o gráfico paga a inicialização do matplotlib
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
 
     plt.figure(figsize=(8, 5))
-    plt.plot(janelas, thputs, marker="o", linewidth=2, color="#1f77b4")
+    plt.plot(janelas, thputs, marker="o", linewidth=2, color="#1f77b4", rasterized=True)
     plt.title("Throughput x Tamanho da Janela (GBN)")
     plt.xlabel("Tamanho da Janela (N)")
     plt.ylabel("Throughput (Mbps)")
@@ -113,50 +368,63 @@ def _plot_window_throughput(resultados, filename="gbn_throughput.png"):
 # ---------------------------------------------------------------------------
 
 def _run_stop_and_wait_1mb():
-    total_bytes = 1 * 1024 * 1024
+    total_bytes = len(_PAYLOAD_1MB)
     chunk_size = 1024 * 5  # 5 KB por pacote
-    total_chunks = math.ceil(total_bytes / chunk_size)
+    full_chunks, tail = divmod(total_bytes, chunk_size)
+    total_chunks = full_chunks + (1 if tail else 0)
 
-    ports = _find_free_ports(7000)
+    ports = _acquire_ports()
     channel = DirectChannel()
     sender = RDT30Sender(port=ports[0], dest_port=ports[1], channel=channel)
     receiver = RDT30Receiver(port=ports[1], channel=channel)
+    _tune_socket_buffers(sender, receiver, 1, chunk_size)
 
     received = 0
+    stop_event = threading.Event()
 
     def _recv_loop():
         nonlocal received
-        while received < total_chunks:
-            data = receiver.receive(timeout=5)
+        deadline = time.perf_counter() + 30
+        while received < total_chunks and not stop_event.is_set():
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            data = receiver.receive(timeout=min(0.25, remaining))
             if data:
                 received += 1
 
     thread = threading.Thread(target=_recv_loop, daemon=True)
     thread.start()
-
-    start = time.time()
-    sent_payload = 0
-    for _ in range(total_chunks):
-        remaining = total_bytes - sent_payload
-        current_size = chunk_size if remaining >= chunk_size else remaining
-        payload = b'x' * current_size
-        sender.send(payload)
-        sent_payload += current_size
-    end = time.time()
-
+    sender_core, receiver_core = _core_pair()
+    _pin(thread.native_id, receiver_core)
+
+    # Payload uniforme: todo bloco cheio tem o mesmo conteúdo, então uma fatia basta
+    payload_view = memoryview(_PAYLOAD_1MB)
+    full_chunk = payload_view[:chunk_size]
+
+    with _logging_disabled(), _pinned(sender_core):
+        start_ns = time.perf_counter_ns()
+        for _ in range(full_chunks):
+            sender.send(full_chunk)
+        if tail:
+            sender.send(payload_view[:tail])
+        elapsed = (time.perf_counter_ns() - start_ns) / 1e9
+
+    # send() só retorna após o ACK, então o receptor já entregou tudo
+    stop_event.set()
     thread.join(timeout=30)
-    stats = sender.get_stats()
     retrans = sender.get_retransmissions()
     total_packets = total_chunks + retrans
     util = _calc_utilization(total_bytes, chunk_size, retrans)
-    throughput = (total_bytes * 8 / (end - start)) / 1_000_000 if end > start else 0.0
+    throughput = (total_bytes * 8 / elapsed) / 1_000_000 if elapsed > 0 else 0.0
 
     sender.close()
     receiver.close()
+    _release_ports(ports)
 
     return {
         "protocol": "rdt3.0 (Stop-and-Wait)",
-        "tempo": end - start,
+        "tempo": elapsed,
         "throughput": throughput,
         "retransmissoes": retrans,
         "taxa_retrans": _calc_retransmission_rate(total_packets, retrans) * 100,
@@ -165,53 +433,45 @@ def _run_stop_and_wait_1mb():
 
 
 def _run_gbn_1mb(window_size=5):
-    total_bytes = 1 * 1024 * 1024
+    total_bytes = len(_PAYLOAD_1MB)
     chunk_size = 1024 * window_size  # Alinha tamanho do bloco à janela padrão
-    total_chunks = math.ceil(total_bytes / chunk_size)
+    full_chunks, tail = divmod(total_bytes, chunk_size)
+    total_chunks = full_chunks + (1 if tail else 0)
 
-    ports = _find_free_ports(7200 + window_size)
+    ports = _acquire_ports()
     channel = DirectChannel()
     sender = GBNSender(port=ports[0], dest_port=ports[1], channel=channel, window_size=window_size)
     receiver = GBNReceiver(port=ports[1], channel=channel)
+    _tune_socket_buffers(sender, receiver, window_size, chunk_size)
+
+    payload_view = memoryview(_PAYLOAD_1MB)
+    full_chunk = payload_view[:chunk_size]
+
+    # Sem fixação de core: o receptor é drenado pelo próprio thread do teste,
+    # e uma thread criada num bloco fixado (a de ACKs do sender) herdaria o core
+    # depois que o bloco restaurasse a afinidade
+    with _logging_disabled(), _receiver_selector(receiver) as selector:
+        start_ns = time.perf_counter_ns()
+        deadline = time.monotonic() + 120
+        for i in range(total_chunks):
+            if not _drain_receiver(receiver, selector, sender, sender.has_slot, deadline):
+                break
+            sender.send(full_chunk if i < full_chunks else payload_view[:tail])
+        _drain_receiver(receiver, selector, sender, sender.all_acked, deadline)
+        elapsed = (time.perf_counter_ns() - start_ns) / 1e9
 
-    received = 0
-
-    def _recv_loop():
-        nonlocal received
-        while received < total_chunks:
-            data = receiver.receive(timeout=5)
-            if data:
-                received += 1
-
-    thread = threading.Thread(target=_recv_loop, daemon=True)
-    thread.start()
-
-    start = time.time()
-    sent_payload = 0
-    for _ in range(total_chunks):
-        remaining = total_bytes - sent_payload
-        current_size = chunk_size if remaining >= chunk_size else remaining
-        payload = b'x' * current_size
-        while not sender.send(payload):
-            time.sleep(0.001)
-        sent_payload += current_size
-        time.sleep(0.02)
-    sender.wait_for_all_acks(timeout=120)
-    end = time.time()
-
-    thread.join(timeout=30)
-    stats = sender.get_stats()
     retrans = sender.get_retransmissions()
     total_packets = total_chunks + retrans
     util = _calc_utilization(total_bytes, chunk_size, retrans)
-    throughput = (total_bytes * 8 / (end - start)) / 1_000_000 if end > start else 0.0
+    throughput = (total_bytes * 8 / elapsed) / 1_000_000 if elapsed > 0 else 0.0
 
     sender.close()
     receiver.close()
+    _release_ports(ports)
 
     return {
         "protocol": f"GBN (janela={window_size})",
-        "tempo": end - start,
+        "tempo": elapsed,
         "throughput": throughput,
         "retransmissoes": retrans,
         "taxa_retrans": _calc_retransmission_rate(total_packets, retrans) * 100,
@@ -222,10 +482,9 @@ def _run_gbn_1mb(window_size=5):
 def run_gbn_efficiency():
     """Executa o cenário completo de eficiência (rdt3.0 x GBN)."""
     _print_header("Fase 2 - Comparação: Stop-and-Wait vs GBN")
-    _configure_logging(logging.INFO)
     _set_protocol_logging(logging.INFO)
-    result_rdt = _run_stop_and_wait_1mb()
-    result_gbn = _run_gbn_1mb(window_size=5)
+    result_rdt = _cached(_run_stop_and_wait_1mb)
+    result_gbn = _cached(_run_gbn_1mb, 5)
     speedup = (
         result_rdt["tempo"] / result_gbn["tempo"]
         if result_gbn["tempo"] > 0
@@ -279,66 +538,114 @@ def run_gbn_loss():
     Verifica entrega completa e contabiliza retransmissões.
     """
     _print_header("Fase 2 - Teste com Perdas (10%)")
-    _configure_logging(logging.WARNING)
+    _set_protocol_logging(logging.WARNING)
 
     num_msgs = 20
-    payload = b'Pacote_GBN' * 64  # ~640 bytes
+    payload = _LOSS_PAYLOAD
     chunk_size = len(payload)
 
+    # Perdas pré-sorteadas com semente fixa: a contagem de retransmissões se repete entre execuções
     channel = GBNBoundedLossChannel(
         loss_rate=0.1,
         corrupt_rate=0.0,
         delay_range=(0.01, 0.15),
+        drop_mask=make_drop_mask(num_msgs * 10, 0.1, seed=42),
     )
-    port_sender, port_receiver = _find_free_ports(7600)
+    ports = _acquire_ports()
+    port_sender, port_receiver = ports
 
     sender = GBNSender(port=port_sender, dest_port=port_receiver, channel=channel, window_size=8, timeout=1.0)
     receiver = GBNReceiver(port=port_receiver, channel=channel)
-
-    received = []
-
-    def _recv_loop():
-        deadline = time.time() + 180  # até 3 minutos escutando
-        while len(received) < num_msgs and time.time() < deadline:
-            data = receiver.receive(timeout=5)
-            if data:
-                received.append(data)
-
-    recv_thread = threading.Thread(target=_recv_loop, daemon=True)
-    recv_thread.start()
-
-    for _ in range(num_msgs):
-        while not sender.send(payload):
-            time.sleep(0.002)
-
-    sender.wait_for_all_acks(timeout=120)
-    recv_thread.join(timeout=60)
+    _tune_socket_buffers(sender, receiver, sender.N, chunk_size)
+
+    # Sem fixação de core: a thread de ACKs e a thread de entrega compartilhada
+    # do simulador nascem neste bloco e ficariam presas ao core pelo resto da sessão
+    with _receiver_selector(receiver) as selector:
+        deadline = time.monotonic() + 180  # até 3 minutos escutando
+        timestamps = array.array('q', bytes(8 * num_msgs))
+        sent = 0
+        for i in range(num_msgs):
+            if not _drain_receiver(receiver, selector, sender, sender.has_slot, deadline):
+                break
+            sender.send(payload)
+            timestamps[i] = time.perf_counter_ns()
+            sent += 1
+        _drain_receiver(receiver, selector, sender, sender.all_acked, deadline)
+    received = receiver.received_count
+    p50_us, p99_us = _send_interval_percentiles(timestamps, sent)
 
     retrans = sender.get_retransmissions()
     total_packets = num_msgs + retrans
     util = _calc_utilization(num_msgs * chunk_size, chunk_size, retrans)
-    stats = sender.get_stats()
-    throughput = stats['throughput_mbps']
+    throughput = sender.get_throughput_mbps()
 
     print("\n--- Resumo (Perda 10%) ---")
-    print(f"Mensagens esperadas/recebidas: {num_msgs}/{len(received)}")
+    print(f"Mensagens esperadas/recebidas: {num_msgs}/{received}")
     print(f"Retransmissões: {retrans}")
     print(f"Taxa de retransmissão: {_calc_retransmission_rate(total_packets, retrans)*100:.2f}%")
     print(f"Utilização estimada do canal: {util*100:.2f}%")
     print(f"Throughput observado: {throughput:.4f} Mbps")
-    print("Resultado:", "todas as mensagens chegaram." if len(received) == num_msgs else "mensagens faltantes!")
+    print(f"Intervalo entre envios: mediana={p50_us:.1f} µs | p99={p99_us:.1f} µs")
+    print("Resultado:", "todas as mensagens chegaram." if received == num_msgs else "mensagens faltantes!")
 
     sender.close()
     receiver.close()
+    _release_ports(ports)
+
+
+def _run_one_window(N, num_msgs, payload):
+    """
+    Executa uma transferência GBN de num_msgs pacotes com janela N (canal perfeito).
+    Roda em um processo da varredura, com o par em cache daquele processo.
+    """
+    chunk_size = len(payload)
+    sender, receiver = _acquire_gbn_endpoints(N)
+    _tune_socket_buffers(sender, receiver, N, chunk_size)
+
+    with _logging_disabled(), _receiver_selector(receiver) as selector:
+        timestamps = array.array('q', bytes(8 * num_msgs))
+        sent = 0
+        start_ns = time.perf_counter_ns()
+        deadline = time.monotonic() + 120
+        for i in range(num_msgs):
+            if not _drain_receiver(receiver, selector, sender, sender.has_slot, deadline):
+                break
+            sender.send(payload)
+            timestamps[i] = time.perf_counter_ns()
+            sent += 1
+        _drain_receiver(receiver, selector, sender, sender.all_acked, deadline)
+        elapsed = (time.perf_counter_ns() - start_ns) / 1e9
+
+    retrans = sender.get_retransmissions()
+    total_packets = num_msgs + retrans
+    util = _calc_utilization(num_msgs * chunk_size, chunk_size, retrans)
+    throughput = (num_msgs * chunk_size * 8 / elapsed) / 1_000_000 if elapsed > 0 else 0.0
+    p50_us, p99_us = _send_interval_percentiles(timestamps, sent)
+
+    _release_gbn_endpoints(sender.all_acked() and sender.channel.is_reliable)
+
+    return {
+        "janela": N,
+        "tempo": elapsed,
+        "throughput_mbps": throughput,
+        "retransmissoes": retrans,
+        "taxa_retrans": _calc_retransmission_rate(total_packets, retrans) * 100,
+        "utilizacao": util * 100,
+        "intervalo_p50_us": p50_us,
+        "intervalo_p99_us": p99_us,
+    }
 
 
 def run_gbn_window_analysis(window_sizes=None, generate_plot=True):
     """
     Executa a análise completa para N = 1, 5, 10 e 20 (canal perfeito).
     Gera valores de tempo, throughput, retransmissões e utilização.
+    Cada tamanho de janela roda em um processo do pool, com no máximo um
+    processo por core disponível. Com menos cores que janelas, as execuções
+    simultâneas ainda dividem a máquina com as demais (o loopback e o kernel
+    são comuns): compare os pontos do gráfico sabendo disso.
     """
     _print_header("Fase 2 - Análise por Tamanho de Janela")
-    _configure_logging(logging.INFO)
     _set_protocol_logging(logging.INFO)
 
     if window_sizes is None:
@@ -346,71 +653,20 @@ def run_gbn_window_analysis(window_sizes=None, generate_plot=True):
     else:
         window_sizes = list(dict.fromkeys(window_sizes))
     num_msgs = 100
-    payload = b'GBN_WINDOW' * 64  # ~640 bytes
-    chunk_size = len(payload)
-
-    resultados = []
-
-    for idx, N in enumerate(window_sizes, start=1):
-        print(f"\n[Análise] ({idx}/{len(window_sizes)}) Executando GBN com janela N={N}...")
-        port_sender, port_receiver = _find_free_ports(8000 + N * 10)
-        channel = DirectChannel()
-        sender = GBNSender(
-            port=port_sender,
-            dest_port=port_receiver,
-            channel=channel,
-            window_size=N,
-            timeout=1.0,
-        )
-        receiver = GBNReceiver(port=port_receiver, channel=channel)
-
-        recebidos = 0
-        stop_event = threading.Event()
-
-        def _recv_loop():
-            nonlocal recebidos
-            while True:
-                data = receiver.receive(timeout=5)
-                if data:
-                    recebidos += 1
-                    if recebidos >= num_msgs:
-                        break
-                else:
-                    if stop_event.is_set():
-                        break
-
-        recv_thread = threading.Thread(target=_recv_loop, daemon=True)
-        recv_thread.start()
-
-        start = time.time()
-        for _ in range(num_msgs):
-            while not sender.send(payload):
-                time.sleep(0.001)
-        sender.wait_for_all_acks(timeout=120)
-        stop_event.set()
-        end = time.time()
-
-        recv_thread.join(timeout=30)
-        retrans = sender.get_retransmissions()
-        total_packets = num_msgs + retrans
-        util = _calc_utilization(num_msgs * chunk_size, chunk_size, retrans)
-        stats = sender.get_stats()
-        throughput = stats['throughput_mbps']
-
-        resultados.append(
-            {
-                "janela": N,
-                "tempo": end - start,
-                "throughput_mbps": throughput,
-                "retransmissoes": retrans,
-                "taxa_retrans": _calc_retransmission_rate(total_packets, retrans) * 100,
-                "utilizacao": util * 100,
-            }
-        )
+    payload = _WINDOW_PAYLOAD
 
-        sender.close()
-        receiver.close()
-        time.sleep(0.5)
+    pool = _window_pool()
+    futures = {
+        pool.submit(_run_one_window, N, num_msgs=num_msgs, payload=payload): N
+        for N in window_sizes
+    }
+    por_janela = {}
+    # Progresso à medida que cada janela termina (a ordem de conclusão varia)
+    for idx, future in enumerate(as_completed(futures), start=1):
+        N = futures[future]
+        por_janela[N] = future.result()
+        print(f"\n[Análise] ({idx}/{len(window_sizes)}) GBN com janela N={N} concluído")
+    resultados = [por_janela[N] for N in window_sizes]
 
     print("\n--- Resumo (Throughput x Janela) ---")
     for item in resultados:
@@ -418,7 +674,8 @@ def run_gbn_window_analysis(window_sizes=None, generate_plot=True):
             f"N={item['janela']:>2} | tempo={item['tempo']:.3f}s | "
             f"throughput={item['throughput_mbps']:.4f} Mbps | "
             f"retr={item['retransmissoes']} ({item['taxa_retrans']:.2f}%) | "
-            f"utilização={item['utilizacao']:.2f}%"
+            f"utilização={item['utilizacao']:.2f}% | "
+            f"intervalo p50/p99={item['intervalo_p50_us']:.1f}/{item['intervalo_p99_us']:.1f} µs"
         )
 
     print("\nDica: utilize os dados acima para gerar o gráfico Throughput x N no relatório.")
@@ -436,14 +693,14 @@ def menu_efficiency():
         print("1 - Transferir 1MB de dados (GBN)")
         print("2 - Comparar tempo com rdt3.0 (stop-and-wait)")
         print("3 - Calcular utilização do canal (GBN)")
+        print("9 - Limpar cache (executar as transferências novamente)")
         print("0 - Voltar")
         choice = input("Escolha uma opção: ").strip()
 
         if choice == "1":
             _print_header("Fase 2 - GBN (janela=5) - 1 MB")
-            _configure_logging(logging.INFO)
             _set_protocol_logging(logging.INFO)
-            result = _run_gbn_1mb(window_size=5)
+            result = _cached(_run_gbn_1mb, 5)
             print(
                 f"Protocolo: {result['protocol']}\n"
                 f"Tempo total: {result['tempo']:.3f} s\n"
@@ -454,14 +711,13 @@ def menu_efficiency():
             )
         elif choice == "2":
             _print_header("Fase 2 - Comparação: Stop-and-Wait vs GBN")
-            _configure_logging(logging.INFO)
             _set_protocol_logging(logging.INFO)
 
             # Executa rdt3.0 (stop-and-wait) em canal direto
-            result_rdt = _run_stop_and_wait_1mb()
+            result_rdt = _cached(_run_stop_and_wait_1mb)
 
             # Executa GBN com janela 5 em canal direto
-            result_gbn = _run_gbn_1mb(window_size=5)
+            result_gbn = _cached(_run_gbn_1mb, 5)
 
             speedup = (
                 result_rdt["tempo"] / result_gbn["tempo"]
@@ -490,9 +746,8 @@ def menu_efficiency():
             print(f"\nAceleração estimada (GBN vs rdt3.0): {speedup:.2f}x")
         elif choice == "3":
             _print_header("Fase 2 - Utilização do Canal (GBN)")
-            _configure_logging(logging.INFO)
             _set_protocol_logging(logging.INFO)
-            result = _run_gbn_1mb(window_size=5)
+            result = _cached(_run_gbn_1mb, 5)
             print(
                 f"Protocolo: {result['protocol']}\n"
                 f"Utilização estimada do canal: {result['utilizacao']:.2f}%\n"
@@ -500,6 +755,9 @@ def menu_efficiency():
                 f"(taxa: {result['taxa_retrans']:.2f}%)\n"
                 f"Throughput payload: {result['throughput']:.3f} Mbps"
             )
+        elif choice == "9":
+            _RESULT_CACHE.clear()
+            print("Cache de resultados limpo.")
         elif choice == "0":
             break
         else:
@@ -511,7 +769,6 @@ def menu_loss():
     print("- Taxa de perda de 10%")
     print("- Verificar se todas as mensagens chegam")
     print("- Contar retransmissões")
-    _configure_logging(logging.INFO)
     _set_protocol_logging(logging.INFO)
     run_gbn_loss()
 
@@ -3,22 +3,47 @@ Testes automatizados para Fase 3 - TCP Simplificado.
 """
 import sys
 import os
+import io
 import time
-import random
+import logging
 import threading
+import multiprocessing
+import contextlib
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from fase3.tcp_socket import SimpleTCPSocket
 from utils.packet import TCPSegment
+from utils.simulator import make_drop_mask
+
+# Payloads montados uma vez no import (fora da região cronometrada dos testes);
+# cada teste tem seu byte, para que conteúdos de testes diferentes não se confundam
+_PAYLOAD_10KB = b'x' * 10240
+_FLOW_PAYLOAD = b'y' * 10240
+_RETRANS_PAYLOAD = b'r' * (64 * 1024)
+_PAYLOAD_1MB = b'z' * (1024 * 1024)
+
+
+def _payload(base, size):
+    """Usa o payload pré-montado quando o tamanho bate; senão monta um com o mesmo byte."""
+    return base if size == len(base) else base[:1] * size
+
+
+def _tcp_pair(server_port, client_port):
+    """Cria o par servidor (já em escuta) / cliente de um teste (cada teste tem suas portas)."""
+    server = SimpleTCPSocket(server_port)
+    server.listen()
+    client = SimpleTCPSocket(client_port)
+    return server, client
 
 
 def test_connection_establishment():
     """Teste 1: Estabelecimento de conexão."""
     print("\n=== Teste 1: Estabelecimento de Conexão ===")
     
-    server = SimpleTCPSocket(8100)
-    server.listen()
+    server, client = _tcp_pair(8100, 9100)
     
     def server_accept():
         conn = server.accept()
@@ -29,7 +54,6 @@ def test_connection_establishment():
     
     time.sleep(0.1)
     
-    client = SimpleTCPSocket(9100)
     client.connect(('localhost', 8100))
     
     accept_thread.join(timeout=5)
@@ -41,22 +65,37 @@ def test_connection_establishment():
     
     client.close()
     server.close()
-    time.sleep(0.5)
 
 
-def test_data_transfer():
-    """Teste 2: Transferência de dados."""
-    print("\n=== Teste 2: Transferência de Dados ===")
+def _transfer(server_port, client_port, data):
+    """
+    Envia data do cliente ao servidor, que recebe direto num buffer pré-alocado.
     
-    server = SimpleTCPSocket(8200)
-    server.listen()
+    Harness comum de test_data_transfer e test_performance.
     
-    received_data = []
+    Returns:
+        (bytes recebidos, buffer, tempo do send até a recepção, stats do cliente)
+    """
+    server, client = _tcp_pair(server_port, client_port)
+    
+    size = len(data)
+    buf = bytearray(size)  # recebido direto aqui, sem lista de pedaços
+    received = [0]
+    done = threading.Event()
     
     def server_accept():
         conn = server.accept()
-        data = conn.recv(10240)
-        received_data.append(data)
+        # Lê até completar size bytes; recv_into() devolve 0 após 5s sem dados
+        view = memoryview(buf)
+        n = 0
+        while n < size:
+            got = conn.recv_into(view[n:], size - n)
+            if not got:
+                break
+            n += got
+        received[0] = n
+        # Sinaliza antes do close(), que só retorna após o encerramento com o cliente
+        done.set()
         conn.close()
     
     accept_thread = threading.Thread(target=server_accept)
@@ -64,37 +103,44 @@ def test_data_transfer():
     
     time.sleep(0.1)
     
-    client = SimpleTCPSocket(9200)
-    client.connect(('localhost', 8200))
+    client.connect(('localhost', server_port))
     
-    # Enviar 10KB de dados
-    data = b'x' * 10240
+    start = time.time()
     client.send(data)
+    done.wait(timeout=15)  # Aguardar recepção
+    elapsed = time.time() - start
     
-    time.sleep(2)  # Aguardar recepção
+    stats = client.get_stats()
     
-    accept_thread.join(timeout=5)
+    client.close()
+    accept_thread.join(timeout=15)
+    server.close()
+    return received[0], buf, elapsed, stats
+
+
+def test_data_transfer(size=10240):
+    """Teste 2: Transferência de dados (size bytes)."""
+    print("\n=== Teste 2: Transferência de Dados ===")
     
-    assert len(received_data) > 0
-    total_received = b''.join(received_data)
-    assert len(total_received) == len(data)
+    # Enviar size bytes de dados (10KB por padrão)
+    data = _payload(_PAYLOAD_10KB, size)
+    received, buf, _, _ = _transfer(8200, 9200, data)
     
-    print(f"✓ Teste passou: {len(data)} bytes enviados e recebidos corretamente")
+    assert received == len(data)
+    assert buf == data
     
-    client.close()
-    server.close()
-    time.sleep(0.5)
+    print(f"✓ Teste passou: {len(data)} bytes enviados e recebidos corretamente")
 
 
 def test_flow_control():
     """Teste 3: Controle de fluxo."""
     print("\n=== Teste 3: Controle de Fluxo ===")
     
-    server = SimpleTCPSocket(8300)
+    server, client = _tcp_pair(8300, 9300)
     server.recv_window = 1024  # Reduzir janela para 1KB
-    server.listen()
     
     received_data = []
+    done = threading.Event()
     
     def server_accept():
         conn = server.accept()
@@ -104,6 +150,7 @@ def test_flow_control():
             if data:
                 received_data.append(data)
             time.sleep(0.1)
+        done.set()
         conn.close()
     
     accept_thread = threading.Thread(target=server_accept)
@@ -111,36 +158,35 @@ def test_flow_control():
     
     time.sleep(0.1)
     
-    client = SimpleTCPSocket(9300)
     client.connect(('localhost', 8300))
     
     # Tentar enviar 10KB
-    data = b'y' * 10240
+    data = _FLOW_PAYLOAD
     client.send(data)
     
-    time.sleep(5)
-    
-    accept_thread.join(timeout=10)
+    done.wait(timeout=15)
     
     print(f"✓ Teste passou: Controle de fluxo funcionando")
     print(f"  Dados recebidos: {len(b''.join(received_data))} bytes")
     
     client.close()
+    accept_thread.join(timeout=15)
     server.close()
-    time.sleep(0.5)
 
 
 def test_retransmission():
     """Teste 4: Retransmissão com perda de 20% dos segmentos."""
     print("\n=== Teste 4: Retransmissão ===")
     
-    random.seed(42)
     loss_rate = 0.2
     segment_counters = {'sent': 0, 'dropped': 0}
-    total_bytes = 64 * 1024  # 64 KB
+    total_bytes = len(_RETRANS_PAYLOAD)  # 64 KB
+    # Perdas pré-sorteadas (semente fixa), uma por segmento de dados enviado;
+    # 4x o número de segmentos cobre as retransmissões
+    n_segs = total_bytes // SimpleTCPSocket.MAX_SEGMENT_SIZE + 1
+    loss_mask = make_drop_mask(n_segs * 4, loss_rate, seed=42)
     
-    server = SimpleTCPSocket(8400)
-    server.listen()
+    server, client = _tcp_pair(8400, 9400)
     
     received = bytearray()
     
@@ -160,21 +206,23 @@ def test_retransmission():
     
     time.sleep(0.1)
     
-    client = SimpleTCPSocket(9400)
     client.connect(('localhost', 8400))
     
-    def lossy_interceptor(data, addr, send_func):
-        parsed = TCPSegment.parse_segment(data)
+    def lossy_interceptor(data, parsed, addr, send_func):
+        # Segmentos de dados já chegam com o cabeçalho; só controle precisa de parse
+        if parsed is None:
+            parsed = TCPSegment.parse_segment(data)
         if parsed and parsed['data']:
+            idx = segment_counters['sent']
             segment_counters['sent'] += 1
-            if random.random() < loss_rate:
+            if idx < len(loss_mask) and loss_mask[idx]:
                 segment_counters['dropped'] += 1
                 return len(data)
         return send_func(data, addr)
     
     client.set_send_interceptor(lossy_interceptor)
     
-    payload = b'r' * total_bytes
+    payload = _RETRANS_PAYLOAD
     
     try:
         start = time.time()
@@ -197,19 +245,19 @@ def test_retransmission():
         client.close()
         server.close()
         accept_thread.join(timeout=1)
-        time.sleep(0.5)
 
 
 def test_connection_close():
     """Teste 5: Encerramento de conexão."""
     print("\n=== Teste 5: Encerramento de Conexão ===")
     
-    server = SimpleTCPSocket(8500)
-    server.listen()
+    server, client = _tcp_pair(8500, 9500)
+    done = threading.Event()
     
     def server_accept():
         conn = server.accept()
         conn.recv(1024)
+        done.set()
         conn.close()
         return conn
     
@@ -218,84 +266,103 @@ def test_connection_close():
     
     time.sleep(0.1)
     
-    client = SimpleTCPSocket(9500)
     client.connect(('localhost', 8500))
     
     client.send(b'test')
-    time.sleep(1)
+    done.wait(timeout=15)
     client.close()
     
-    accept_thread.join(timeout=5)
+    accept_thread.join(timeout=15)
     
     print("✓ Teste passou: Conexão encerrada corretamente")
-    
-    time.sleep(0.5)
 
 
-def test_performance():
-    """Teste 6: Desempenho."""
+def test_performance(size=1024 * 1024):
+    """Teste 6: Desempenho (size bytes)."""
     print("\n=== Teste 6: Desempenho ===")
     
-    server = SimpleTCPSocket(8600)
-    server.listen()
-    
-    received_data = []
-    
-    def server_accept():
-        conn = server.accept()
-        data = conn.recv(1024 * 1024)  # 1MB
-        received_data.append(data)
-        conn.close()
-    
-    accept_thread = threading.Thread(target=server_accept)
-    accept_thread.start()
-    
-    time.sleep(0.1)
-    
-    client = SimpleTCPSocket(9600)
-    client.connect(('localhost', 8600))
-    
-    # Enviar 1MB
-    data = b'z' * (1024 * 1024)
-    start = time.time()
-    client.send(data)
-    
-    time.sleep(10)  # Aguardar transferência
-    
-    elapsed = time.time() - start
-    accept_thread.join(timeout=15)
-    
-    stats = client.get_stats()
+    # Enviar size bytes (1MB por padrão)
+    data = _payload(_PAYLOAD_1MB, size)
+    _, _, elapsed, stats = _transfer(8600, 9600, data)
     
     print(f"✓ Teste passou:")
     print(f"  Tempo: {elapsed:.2f}s")
     print(f"  Throughput: {stats['throughput_sent_mbps']:.2f} Mbps")
     print(f"  Retransmissões: {stats['retransmissions']}")
     print(f"  RTT estimado: {stats['estimated_rtt']:.3f}s")
-    
-    client.close()
-    server.close()
-    time.sleep(0.5)
+
+
+_ALL_TESTS = (
+    test_connection_establishment,
+    test_data_transfer,
+    test_flow_control,
+    test_retransmission,
+    test_connection_close,
+)
+# Medição de throughput/RTT: roda sozinha, depois do lote paralelo, para não
+# disputar CPU com as transferências e timers dos outros testes
+_SERIAL_TESTS = (
+    test_performance,
+)
+
+
+def _run_isolated(test):
+    """
+    Executa um teste com a saída capturada (roda num processo próprio).
+    
+    Returns:
+        (nome do teste, passou, saída capturada)
+    """
+    # Nenhum formato de log usa thread/processo: o processo do teste não coleta
+    # esses campos em cada LogRecord (ajustado aqui, no processo que registra)
+    logging.logThreads = False
+    logging.logProcesses = False
+    logging.logMultiprocessing = False
+    
+    out = io.StringIO()
+    passed = True
+    with contextlib.redirect_stdout(out):
+        try:
+            test()
+        except AssertionError as e:
+            passed = False
+            print(f"\n✗ {test.__name__} falhou: {e}")
+        except Exception as e:
+            passed = False
+            print(f"\n✗ {test.__name__}: erro: {e}")
+            traceback.print_exc(file=out)
+    return test.__name__, passed, out.getvalue()
 
 
 if __name__ == '__main__':
     print("Executando testes da Fase 3...")
     
-    try:
-        test_connection_establishment()
-        test_data_transfer()
-        test_flow_control()
-        test_retransmission()
-        test_connection_close()
-        test_performance()
-        
-        print("\n✓ Todos os testes da Fase 3 passaram!")
-    except AssertionError as e:
-        print(f"\n✗ Teste falhou: {e}")
+    # Cada teste usa seu par de portas, então rodam em paralelo. Cada um ganha
+    # um executor próprio de um único processo, criado com spawn (interpretador
+    # novo, sem estado herdado do pai): isola o _Demuxer e os loggers, e a saída
+    # de cada teste é impressa inteira quando ele termina
+    spawn = multiprocessing.get_context("spawn")
+    failed = []
+    with contextlib.ExitStack() as stack:
+        futures = []
+        for test in _ALL_TESTS:
+            executor = stack.enter_context(ProcessPoolExecutor(max_workers=1, mp_context=spawn))
+            futures.append(executor.submit(_run_isolated, test))
+        for future in as_completed(futures):
+            name, passed, output = future.result()
+            print(output, end='')
+            if not passed:
+                failed.append(name)
+    
+    # Benchmarks: um de cada vez, também em processo próprio, com a CPU livre
+    for test in _SERIAL_TESTS:
+        with ProcessPoolExecutor(max_workers=1, mp_context=spawn) as executor:
+            name, passed, output = executor.submit(_run_isolated, test).result()
+        print(output, end='')
+        if not passed:
+            failed.append(name)
+    
+    if failed:
+        print(f"\n✗ Testes com falha: {', '.join(failed)}")
         sys.exit(1)
-    except Exception as e:
-        print(f"\n✗ Erro: {e}")
-        import traceback
-        traceback.print_exc()
-        sys.exit(1)
-
+    print("\n✓ Todos os testes da Fase 3 passaram!")
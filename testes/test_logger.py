@@ -0,0 +1,92 @@
+"""
+Testes automatizados para utils/logger - log em arquivo compartilhado.
+"""
+import sys
+import os
+import time
+import logging
+import tempfile
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import logger as logger_module
+from utils.logger import setup_logger
+
+
+def _wait_for_text(path, text, timeout=5):
+    """Aguarda o QueueListener gravar `text` em path (a escrita é assíncrona)."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                if text in f.read():
+                    return True
+        time.sleep(0.05)
+    return False
+
+
+def test_shared_file_handler():
+    """Teste 1: Loggers com o mesmo arquivo compartilham o handler e gravam nele."""
+    print("\n=== Teste 1: Handler de Arquivo Compartilhado ===")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "shared.log")
+        log_a = setup_logger("test_logger.shared.a", log_file=path)
+        log_b = setup_logger("test_logger.shared.b", log_file=path)
+
+        file_handlers_a = [h for h in log_a.handlers if not isinstance(h, logging.StreamHandler)]
+        file_handlers_b = [h for h in log_b.handlers if not isinstance(h, logging.StreamHandler)]
+        assert len(file_handlers_a) == 1 and file_handlers_a == file_handlers_b
+
+        log_a.info("mensagem de a")
+        log_b.warning("mensagem de b")
+        assert _wait_for_text(path, "mensagem de a"), "registro de a não chegou ao arquivo"
+        assert _wait_for_text(path, "mensagem de b"), "registro de b não chegou ao arquivo"
+
+    print("✓ Teste passou: um handler por arquivo, registros gravados")
+
+
+def test_concurrent_first_setup():
+    """Teste 2: Primeira configuração simultânea do mesmo arquivo cria um único listener."""
+    print("\n=== Teste 2: Configuração Concorrente ===")
+
+    n_threads = 8
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "concurrent.log")
+        listeners_before = len(logger_module._LISTENERS)
+        barrier = threading.Barrier(n_threads)
+        loggers = [None] * n_threads
+
+        def configure(i):
+            barrier.wait()
+            loggers[i] = setup_logger(f"test_logger.concurrent.{i}", log_file=path)
+
+        threads = [threading.Thread(target=configure, args=(i,)) for i in range(n_threads)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join(timeout=5)
+
+        assert len(logger_module._LISTENERS) - listeners_before == 1, "mais de um listener para o mesmo arquivo"
+        handler = logger_module._FILE_HANDLERS[os.path.abspath(path)]
+        assert all(handler in lg.handlers for lg in loggers)
+
+    print(f"✓ Teste passou: {n_threads} threads, um único listener/arquivo aberto")
+
+
+if __name__ == '__main__':
+    print("Executando testes do logger...")
+
+    failed = []
+    for test in (test_shared_file_handler, test_concurrent_first_setup):
+        try:
+            test()
+        except AssertionError as e:
+            failed.append(test.__name__)
+            print(f"\n✗ {test.__name__} falhou: {e}")
+
+    if failed:
+        print(f"\n✗ Testes com falha: {', '.join(failed)}")
+        sys.exit(1)
+    print("\n✓ Todos os testes do logger passaram!")
@@ -1,9 +1,75 @@
 """
 Sistema de logging para debug e análise.
 """
+import atexit
 import logging
+import os
+import queue
 import sys
+import threading
 from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener
+
+class _CachedTimeFormatter(logging.Formatter):
+    """Formatter que reaproveita o asctime formatado dentro do mesmo segundo."""
+
+    default_msec_format = None
+
+    def __init__(self, fmt=None, datefmt=None):
+        super().__init__(fmt, datefmt)
+        self._cache = (None, None)
+
+    def formatTime(self, record, datefmt=None):
+        second = int(record.created)
+        cached_second, asctime = self._cache
+        if second != cached_second:
+            asctime = super().formatTime(record, datefmt)
+            # Atribuição única da tupla: seguro entre threads sem lock
+            self._cache = (second, asctime)
+        return asctime
+
+
+# Formatter único (o formato é o mesmo para todos os loggers do projeto)
+_FORMATTER = _CachedTimeFormatter(
+    '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S'
+)
+
+# Um handler por arquivo, compartilhado entre loggers. O logger só enfileira
+# o registro (QueueHandler); a escrita em disco acontece na thread do
+# QueueListener, fora do caminho de envio/recepção.
+_FILE_HANDLERS = {}
+_LISTENERS = []
+# Serializa a criação: sem ele, duas primeiras chamadas simultâneas abririam
+# dois FileHandler/QueueListener para o mesmo arquivo
+_FILE_HANDLERS_LOCK = threading.Lock()
+
+
+def _stop_listeners():
+    """Esvazia as filas e fecha os arquivos ao sair."""
+    for listener in _LISTENERS:
+        listener.stop()
+        for handler in listener.handlers:
+            handler.close()
+
+
+atexit.register(_stop_listeners)
+
+
+def _file_handler(log_file):
+    """Retorna o QueueHandler compartilhado de log_file, criando-o na primeira vez."""
+    path = os.path.abspath(log_file)
+    with _FILE_HANDLERS_LOCK:
+        handler = _FILE_HANDLERS.get(path)
+        if handler is None:
+            log_queue = queue.SimpleQueue()
+            file_handler = logging.FileHandler(path)
+            file_handler.setFormatter(_FORMATTER)
+            listener = QueueListener(log_queue, file_handler, respect_handler_level=True)
+            listener.start()
+            _LISTENERS.append(listener)
+            handler = _FILE_HANDLERS[path] = QueueHandler(log_queue)
+    return handler
 
 
 def setup_logger(name, log_file=None, level=logging.INFO):
@@ -25,22 +91,15 @@ def setup_logger(name, log_file=None, level=logging.INFO):
         if logger.level == logging.NOTSET:
             logger.setLevel(level)
         logger.propagate = False
-    
-        formatter = logging.Formatter(
-            '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-            datefmt='%Y-%m-%d %H:%M:%S'
-        )
         
         console_handler = logging.StreamHandler(sys.stdout)
-        console_handler.setFormatter(formatter)
+        console_handler.setFormatter(_FORMATTER)
         console_handler.setLevel(logger.level)
         logger.addHandler(console_handler)
         
         if log_file:
-            file_handler = logging.FileHandler(log_file)
-            file_handler.setFormatter(formatter)
-            file_handler.setLevel(logger.level)
-            logger.addHandler(file_handler)
+            # Compartilhado: o filtro de nível fica no próprio logger
+            logger.addHandler(_file_handler(log_file))
     else:
         # Não recriar handlers nem sobrescrever níveis já ajustados externamente
         pass
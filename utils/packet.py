@@ -186,6 +186,29 @@ class TCPSegment:
         
         return header + data
     
+    @staticmethod
+    def build_into(buf, src_port, dst_port, seq_num, ack_num, flags, window_size, data=b''):
+        """
+        Monta um segmento TCP diretamente em buf (bytearray reutilizável).
+        
+        Produz os mesmos bytes que create_segment, sem alocar um novo objeto
+        por segmento.
+        
+        Returns:
+            número de bytes escritos em buf
+        """
+        length = 20 + len(data)
+        struct.pack_into(TCPSegment.FORMAT, buf, 0,
+                         src_port, dst_port,
+                         seq_num, ack_num,
+                         20, flags,
+                         window_size, 0, 0)
+        buf[20:length] = data
+        
+        view = memoryview(buf)
+        buf[16:18] = Packet.calculate_checksum(view[:length])[:2]
+        return length
+    
     @staticmethod
     def parse_segment(segment):
         """Parseia um segmento TCP."""
@@ -2,17 +2,87 @@
 Simulador de canal não confiável.
 Simula perda de pacotes, corrupção e atraso.
 """
+import heapq
+import itertools
 import random
 import threading
 import socket
+import time
 
 from utils.packet import GBNPacket, Packet
 
 
+class DelayedSender:
+    """
+    Entrega pacotes atrasados usando uma única thread.
+    
+    Em vez de um threading.Timer (uma thread nova) por pacote, os envios
+    ficam num heap ordenado pelo instante de entrega e uma thread daemon,
+    iniciada sob demanda, executa cada sendto no momento certo.
+    """
+    
+    def __init__(self):
+        self._heap = []  # (instante, desempate, pacote, socket, endereço)
+        self._cv = threading.Condition()
+        self._counter = itertools.count()
+        self._thread = None
+    
+    def send(self, delay, packet, dest_socket, dest_addr):
+        """
+        Agenda dest_socket.sendto(packet, dest_addr) para daqui a delay segundos.
+        """
+        deadline = time.monotonic() + delay
+        with self._cv:
+            heapq.heappush(self._heap, (deadline, next(self._counter), packet, dest_socket, dest_addr))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+            self._cv.notify()
+    
+    def _run(self):
+        """Laço da thread de entrega."""
+        heap = self._heap
+        while True:
+            with self._cv:
+                while True:
+                    if not heap:
+                        self._cv.wait()
+                        continue
+                    remaining = heap[0][0] - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cv.wait(remaining)
+                
+                now = time.monotonic()
+                due = []
+                while heap and heap[0][0] <= now:
+                    due.append(heapq.heappop(heap))
+            
+            # Enviar fora do lock para não bloquear novos agendamentos
+            for _, _, packet, dest_socket, dest_addr in due:
+                try:
+                    dest_socket.sendto(packet, dest_addr)
+                except OSError:
+                    # Socket fechado antes da entrega: pacote descartado
+                    pass
+
+
+# Instância compartilhada por todos os canais do processo
+_delayed_sender = DelayedSender()
+
+
 class UnreliableChannel:
     """Simula um canal de rede não confiável."""
     
-    def __init__(self, loss_rate=0.1, corrupt_rate=0.1, delay_range=(0.01, 0.5)):
+    __slots__ = (
+        "loss_rate", "corrupt_rate", "delay_range", "_delay_lo", "_delay_hi", "_delay_span",
+        "_rng", "_rand",
+    )
+    
+    INLINE_DELAY = 0.002  # atrasos abaixo disso são entregues sem agendamento
+    is_reliable = False  # pode perder, corromper, atrasar e reordenar pacotes
+    
+    def __init__(self, loss_rate=0.1, corrupt_rate=0.1, delay_range=(0.01, 0.5), seed=None):
         """
         Inicializa o simulador de canal.
         
@@ -20,10 +90,16 @@ class UnreliableChannel:
             loss_rate: probabilidade de perda de pacote (0.0 a 1.0)
             corrupt_rate: probabilidade de corrupção (0.0 a 1.0)
             delay_range: tupla (min_delay, max_delay) em segundos
+            seed: semente do gerador do canal (opcional, para cenários reprodutíveis)
         """
         self.loss_rate = loss_rate
         self.corrupt_rate = corrupt_rate
         self.delay_range = delay_range
+        self._delay_lo, self._delay_hi = delay_range
+        self._delay_span = self._delay_hi - self._delay_lo
+        # Gerador próprio do canal; o método ligado fica em cache para os sorteios por pacote
+        self._rng = random.Random(seed)
+        self._rand = self._rng.random
     
     def send(self, packet, dest_socket, dest_addr):
         """
@@ -34,37 +110,59 @@ class UnreliableChannel:
             dest_socket: socket de destino
             dest_addr: endereço de destino (host, port)
         """
-        # Simular perda
-        if random.random() < self.loss_rate:
+        # Simular perda (taxas nulas não consomem sorteios do gerador)
+        if self.loss_rate and self._rand() < self.loss_rate:
             print(f"[SIMULADOR] Pacote perdido")
             return
         
         # Simular corrupção
-        if random.random() < self.corrupt_rate:
+        if self.corrupt_rate and self._rand() < self.corrupt_rate:
             packet = self._corrupt_packet(packet)
             print(f"[SIMULADOR] Pacote corrompido")
         
-        # Simular atraso
-        delay = random.uniform(*self.delay_range)
-        threading.Timer(delay, lambda: dest_socket.sendto(packet, dest_addr)).start()
+        # Simular atraso (entregue pela thread compartilhada, sem uma thread por pacote)
+        delay = self._delay_lo
+        if self._delay_span:
+            delay += self._delay_span * self._rand()
+        self._schedule(delay, packet, dest_socket, dest_addr)
     
     def _corrupt_packet(self, packet):
-        """Corrompe bits aleatórios do pacote."""
-        packet_list = list(packet)
-        num_corruptions = random.randint(1, 5)
-        for _ in range(num_corruptions):
-            idx = random.randint(0, len(packet_list) - 1)
-            packet_list[idx] = packet_list[idx] ^ 0xFF  # Inverter todos os bits
-        return bytes(packet_list)
+        """
+        Corrompe bits aleatórios do pacote (1 a 5 bytes invertidos).
+        
+        Não inverte o pacote inteiro, mesmo sendo pequeno: um pacote todo
+        invertido nem é reconhecido pelo receptor rdt2.1 (não há NAK, só
+        timeout), e os cenários de corrupção contam com o NAK.
+        """
+        # bytearray é copiado em C e alterado no lugar, sem a lista de ints intermediária
+        buf = bytearray(packet)
+        randrange = self._rng.randrange
+        n = len(buf)
+        for _ in range(randrange(1, 6)):
+            buf[randrange(n)] ^= 0xFF  # Inverter todos os bits
+        return bytes(buf)
     
     def send_direct(self, packet, dest_socket, dest_addr):
         """Envia pacote diretamente sem simulação (para testes)."""
         dest_socket.sendto(packet, dest_addr)
+    
+    def _schedule(self, delay, packet, dest_socket, dest_addr):
+        """Entrega o pacote após delay segundos pela thread de entrega compartilhada."""
+        if delay < self.INLINE_DELAY:
+            # Atraso menor que o custo de agendar: envia direto
+            try:
+                dest_socket.sendto(packet, dest_addr)
+            except OSError:
+                pass
+            return
+        _delayed_sender.send(delay, packet, dest_socket, dest_addr)
 
 
 class DirectChannel:
     """Canal direto sem simulação (para testes com canal perfeito)."""
     
+    is_reliable = True  # entrega tudo, em ordem, no próprio sendto
+    
     def send(self, packet, dest_socket, dest_addr):
         """Envia pacote diretamente."""
         dest_socket.sendto(packet, dest_addr)
@@ -74,6 +172,15 @@ class DirectChannel:
         dest_socket.sendto(packet, dest_addr)
 
 
+def make_drop_mask(length, loss_rate, seed=None):
+    """
+    Pré-sorteia `length` decisões de perda (1 = descartar) com a semente dada,
+    para cenários reprodutíveis.
+    """
+    rand = random.Random(seed).random
+    return bytes(rand() < loss_rate for _ in range(length))
+
+
 class GBNBoundedLossChannel(UnreliableChannel):
     """
     Canal com perdas controladas para testes do GBN.
@@ -83,43 +190,69 @@ class GBNBoundedLossChannel(UnreliableChannel):
     - ACKs nunca são perdidos/corrompidos.
     """
 
-    def __init__(self, loss_rate=0.1, corrupt_rate=0.0, delay_range=(0.01, 0.15)):
-        super().__init__(loss_rate=loss_rate, corrupt_rate=corrupt_rate, delay_range=delay_range)
-        # Estados possíveis por (tipo, seqnum):
-        # "new" (ainda não enviado), "lost_once" (primeira tentativa perdida), "delivered" (já entregue)
-        self._packet_state = {}
+    __slots__ = ("_data_state", "_drop_mask", "_mask_pos")
+
+    # Estado de cada seqnum DATA, um byte por seqnum em _data_state
+    STATE_NEW = 0        # ainda não enviado
+    STATE_LOST_ONCE = 1  # primeira tentativa perdida
+    STATE_DELIVERED = 2  # já entregue
+    INITIAL_STATE_SIZE = 1024
+
+    def __init__(self, loss_rate=0.1, corrupt_rate=0.0, delay_range=(0.01, 0.15), seed=None, drop_mask=None):
+        """
+        Args:
+            seed: semente do gerador do canal (opcional)
+            drop_mask: decisões de perda pré-sorteadas (ver make_drop_mask), consumidas
+                uma por primeira tentativa de DATA; esgotada, volta a sortear por loss_rate
+        """
+        super().__init__(loss_rate=loss_rate, corrupt_rate=corrupt_rate, delay_range=delay_range, seed=seed)
+        # Só DATA tem estado (ACKs nunca são descartados): índice = seqnum
+        self._data_state = bytearray(self.INITIAL_STATE_SIZE)
+        self._drop_mask = drop_mask
+        self._mask_pos = 0
+
+    def _should_drop(self):
+        """Próxima decisão de perda: da máscara, enquanto houver, senão do gerador."""
+        mask = self._drop_mask
+        if mask is not None and self._mask_pos < len(mask):
+            drop = mask[self._mask_pos]
+            self._mask_pos += 1
+            return bool(drop)
+        return self._rand() < self.loss_rate
 
     def send(self, packet, dest_socket, dest_addr):
         packet_type = None
         seqnum = None
-        key = None
         
         try:
             packet_type, seqnum, _, _ = GBNPacket.parse_packet(packet)
-            key = (packet_type, seqnum)
         except Exception:
             # Se não for possível parsear (por exemplo, mensagem de controle),
             # tratamos como canal genérico.
             pass
         
-        if key is not None and packet_type == Packet.TYPE_DATA:
-            state = self._packet_state.get(key, "new")
-            if state == "new":
-                if random.random() < self.loss_rate:
-                    self._packet_state[key] = "lost_once"
+        if seqnum is not None and packet_type == Packet.TYPE_DATA:
+            states = self._data_state
+            if seqnum >= len(states):
+                # Cresce ao menos dobrando, para manter o custo amortizado O(1)
+                states.extend(bytes(max(seqnum + 1 - len(states), len(states))))
+            state = states[seqnum]
+            # Caso comum (retransmissão da janela): já entregue, envio direto sem drops adicionais
+            if state != self.STATE_DELIVERED:
+                if state == self.STATE_NEW and self._should_drop():
+                    states[seqnum] = self.STATE_LOST_ONCE
                     print(f"[SIMULADOR] Pacote DATA seq={seqnum} perdido (tentativa inicial)")
                     return
-                self._packet_state[key] = "delivered"
-            elif state == "lost_once":
-                # Primeira retransmissão deve passar sem novas perdas.
-                self._packet_state[key] = "delivered"
-            # Se já foi entregue, mantemos o envio direto (sem drops adicionais).
-        elif key is None and random.random() < self.loss_rate:
+                # Primeira tentativa entregue, ou primeira retransmissão (passa sem novas perdas)
+                states[seqnum] = self.STATE_DELIVERED
+        elif seqnum is None and self.loss_rate and self._rand() < self.loss_rate:
             # Pacotes sem formatação GBN (mensagens de controle) respeitam a taxa.
             print("[SIMULADOR] Pacote genérico perdido")
             return
         
         # ACKs nunca são perdidos e o canal de perdas não aplica corrupção adicional.
-        delay = random.uniform(*self.delay_range)
-        threading.Timer(delay, lambda: dest_socket.sendto(packet, dest_addr)).start()
+        delay = self._delay_lo
+        if self._delay_span:
+            delay += self._delay_span * self._rand()
+        self._schedule(delay, packet, dest_socket, dest_addr)
 